@@ -0,0 +1,77 @@
+"""
+Compares the model artifact formats of `utils.helpers.save_model`: size on disk, load time in a fresh process
+(a cold-starting worker, imports excluded) and load time in a process that has loaded the model before.
+
+Usage:
+    python -m benchmarks.artifact_load_benchmark --estimators 500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from imblearn.pipeline import Pipeline
+from sklearn.model_selection import GridSearchCV
+from xgboost import XGBClassifier
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.base_pipeline import get_base_pipeline_steps
+from utils.artifacts import ArtifactFormat, load_artifact, save_artifact
+
+# Run in a fresh interpreter, prints the seconds spent loading the artifact
+_COLD_LOAD = """
+import sys, time
+import sklearn.model_selection, xgboost
+import src.pipeline.base_pipeline
+from utils.artifacts import load_artifact
+start = time.perf_counter()
+load_artifact(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+
+def _cold_load(path: str) -> float:
+    output = subprocess.run([sys.executable, '-W', 'ignore', '-c', _COLD_LOAD, path], capture_output=True,
+                            text=True, check=True, cwd=os.getcwd())
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading the model artifact formats.")
+    parser.add_argument("--rows", help="Number of training rows", type=int, default=20_000)
+    parser.add_argument("--estimators", help="Number of boosting rounds", type=int, default=500)
+    parser.add_argument("--repeat", help="Number of timed loads (median is reported)", type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_survey_data(args.rows)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    # Saved the way training saves models: the fitted search around the pipeline
+    pipeline = Pipeline(get_base_pipeline_steps()
+                        + [('xgb', XGBClassifier(n_estimators=args.estimators, max_depth=7))])
+    search = GridSearchCV(pipeline, {'xgb__learning_rate': [0.1]}, cv=2).fit(X, y)
+    expected = search.predict_proba(X)
+
+    print(f"{'format':<12} {'size':>10} {'cold load':>12} {'warm load':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for artifact_format in ArtifactFormat:
+            path = os.path.join(tmp_dir, f'xgb_{artifact_format.value}.joblib')
+            artifact = save_artifact(search, path, artifact_format)
+            size = sum(os.path.getsize(os.path.join(tmp_dir, file))
+                       for file in [os.path.basename(path), artifact.get('booster')] if file is not None)
+            assert np.array_equal(load_artifact(path).predict_proba(X), expected)
+
+            cold = np.median([_cold_load(path) for _ in range(args.repeat)])
+            warm = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                load_artifact(path)
+                warm.append(time.perf_counter() - start)
+            print(f"{artifact_format.value:<12} {size / 2 ** 20:7.2f} MB {cold * 1000:9.1f} ms "
+                  f"{np.median(warm) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
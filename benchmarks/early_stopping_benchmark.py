@@ -0,0 +1,59 @@
+"""
+Compares searching the number of boosting rounds as a grid axis against early stopping on an inner validation
+split: search time, best cross-validated AUC and AUC on a held-out set. The grids are trimmed to the rounds and
+learning rate axes, the other parameters keep their first grid value.
+
+Usage:
+    python -m benchmarks.early_stopping_benchmark --rows 50000 --models xgb,lgbm,catboost
+"""
+import argparse
+import time
+
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterGrid
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.catboost_pipeline import build_catboost_pipeline
+from src.pipeline.lightgbm_pipeline import build_lightgbm_pipeline
+from src.pipeline.xgboost_pipeline import build_xgb_pipeline
+from src.validation.grid_search import SearchStrategy, cached_pipeline_steps
+
+BUILDERS = {'xgb': build_xgb_pipeline, 'lgbm': build_lightgbm_pipeline, 'catboost': build_catboost_pipeline}
+
+
+def _trimmed(search):
+    search.param_grid = {param: values if param.endswith(('__n_estimators', '__iterations', '__learning_rate'))
+                         else values[:1]
+                         for param, values in search.param_grid.items()}
+    search.verbose = 0
+    return search
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark early stopping against a grid over boosting rounds.")
+    parser.add_argument("--rows", help="Number of training rows", type=int, default=50_000)
+    parser.add_argument("--models", help="Comma-separated boosted models", type=str, default='xgb,lgbm,catboost')
+    parser.add_argument("--patience", help="Rounds without improvement before stopping", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_survey_data(args.rows)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    test = make_survey_data(args.rows // 4, seed=0)
+    X_test, y_test = test.drop(columns=['Depression']), test['Depression']
+
+    print(f"{'model':<10} {'mode':<16} {'candidates':>10} {'time':>9} {'cv auc':>8} {'test auc':>9}")
+    for model in args.models.split(','):
+        for mode, early_stopping_rounds in [('grid over rounds', None), ('early stopping', args.patience)]:
+            search = _trimmed(BUILDERS[model](SearchStrategy.GRID, early_stopping_rounds=early_stopping_rounds))
+            n_candidates = len(ParameterGrid(search.param_grid))
+            start = time.perf_counter()
+            with cached_pipeline_steps(search):
+                search.fit(X, y)
+            elapsed = time.perf_counter() - start
+            test_auc = roc_auc_score(y_test, search.predict_proba(X_test)[:, 1])
+            print(f"{model:<10} {mode:<16} {n_candidates:>10} {elapsed:8.1f}s {search.best_score_:8.4f} "
+                  f"{test_auc:9.4f}")
+
+
+if __name__ == "__main__":
+    main()
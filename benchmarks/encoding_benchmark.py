@@ -0,0 +1,89 @@
+"""
+Compares `EncodeCategoricalFeatures` working on category codes, in each of its output modes, against the
+previous `ColumnTransformer` implementation with a dense `OneHotEncoder` and a DataFrame wrapped around
+its output. Reports the transform time and the size of the encoded output.
+
+Usage:
+    python -m benchmarks.encoding_benchmark --rows 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from imblearn.pipeline import Pipeline
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.base_pipeline import get_base_pipeline_steps
+from src.transformers.encoders import EncodeCategoricalFeatures, EncodedOutput, LabelEncoderTransformer, TargetEncoder
+
+
+def fit_column_transformer(encoder: EncodeCategoricalFeatures, X: pd.DataFrame, y: pd.Series) -> ColumnTransformer:
+    """Previous implementation: one ColumnTransformer over the pandas encoders."""
+    return ColumnTransformer(
+        transformers=[
+            ('onehot', OneHotEncoder(sparse_output=False), encoder.one_hot_features),
+            ('target_encoding', TargetEncoder(encoder.target_encoded_features), encoder.target_encoded_features),
+            ('label_encoding', LabelEncoderTransformer(encoder.label_encoded_features), encoder.label_encoded_features)
+        ],
+        remainder='passthrough'
+    ).fit(X, y)
+
+
+def _output_size(output) -> int:
+    if sparse.issparse(output):
+        return output.data.nbytes + output.indices.nbytes + output.indptr.nbytes
+    if isinstance(output, pd.DataFrame):
+        return int(output.memory_usage(index=False).sum())
+    return output.nbytes
+
+
+def _best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark categorical encoding.")
+    parser.add_argument("--rows", help="Numbers of rows to benchmark", type=int, nargs='+',
+                        default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", help="Number of timed runs (best is reported)", type=int, default=3)
+    args = parser.parse_args()
+
+    steps = get_base_pipeline_steps()
+    encoder = steps[2][1]
+    for n_rows in args.rows:
+        data = make_survey_data(n_rows)
+        X, y = data.drop(columns=['Depression']), data['Depression']
+        # The encoder runs on the output of the preprocessing and scaling steps
+        X = Pipeline(steps[:2]).fit_transform(X, y)
+
+        column_transformer = fit_column_transformer(encoder, X, y)
+        names = column_transformer.get_feature_names_out()
+        runs = {'ColumnTransformer (before)':
+                lambda: pd.DataFrame(column_transformer.transform(X), columns=names)}
+        for output in EncodedOutput:
+            fitted = EncodeCategoricalFeatures(encoder.one_hot_features, encoder.target_encoded_features,
+                                               encoder.label_encoded_features, output=output).fit(X, y)
+            runs[f'codes, {output.value}'] = lambda fitted=fitted: fitted.transform(X)
+
+        print(f"{n_rows:,} rows")
+        expected = None
+        for name, run in runs.items():
+            elapsed, result = _best_time(run, args.repeat)
+            values = result.toarray() if sparse.issparse(result) else np.asarray(result, dtype=float)
+            if expected is None:
+                expected = values
+            np.testing.assert_array_equal(values, expected)
+            print(f"  {name:<28} {elapsed:7.3f}s  output {_output_size(result) / 2 ** 20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
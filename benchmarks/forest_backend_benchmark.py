@@ -0,0 +1,71 @@
+"""
+Compares the forest backends of `build_random_forest_pipeline`: fit time, batch and single-row predict latency,
+size of the saved model and AUC on a held-out set. Every backend is fitted once with the largest number of trees of
+its grid and the parameters of the existing random forest's slowest candidate: fully grown trees.
+
+Usage:
+    python -m benchmarks.forest_backend_benchmark --rows 50000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.random_forest_pipeline import ForestBackend, build_random_forest_pipeline
+from utils.artifacts import save_artifact
+
+# Parameters of each backend's fit, the number of trees is the largest of its grid
+BACKEND_PARAMS = {
+    ForestBackend.SKLEARN: {'rf__n_estimators': 200, 'rf__max_depth': None, 'rf__min_samples_leaf': 1},
+    ForestBackend.LIGHTGBM: {'rf__n_estimators': 200, 'rf__num_leaves': 1023, 'rf__min_child_samples': 1,
+                             'rf__feature_fraction': 0.5},
+    ForestBackend.HISTOGRAM: {'rf__max_iter': 200, 'rf__max_leaf_nodes': 31, 'rf__min_samples_leaf': 20},
+}
+
+
+def _median_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the random forest backends.")
+    parser.add_argument("--rows", help="Number of training rows", type=int, default=50_000)
+    parser.add_argument("--repeat", help="Number of timed predictions (median is reported)", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_survey_data(args.rows)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    test = make_survey_data(args.rows // 4, seed=0)
+    X_test, y_test = test.drop(columns=['Depression']), test['Depression']
+    row = X_test.iloc[:1]
+
+    print(f"{'backend':<10} {'fit':>9} {'batch/1k rows':>14} {'single row':>11} {'size':>10} {'test auc':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend in ForestBackend:
+            pipeline = build_random_forest_pipeline(backend=backend).estimator
+            pipeline.set_params(**BACKEND_PARAMS[backend])
+            start = time.perf_counter()
+            pipeline.fit(X, y)
+            fit_time = time.perf_counter() - start
+
+            batch = _median_time(lambda: pipeline.predict_proba(X_test), max(1, args.repeat // 4))
+            single = _median_time(lambda: pipeline.predict_proba(row), args.repeat)
+            path = os.path.join(tmp_dir, f'rf_{backend.value}.joblib')
+            save_artifact(pipeline, path)
+            size = os.path.getsize(path) / 2 ** 20
+            auc = roc_auc_score(y_test, pipeline.predict_proba(X_test)[:, 1])
+            print(f"{backend.value:<10} {fit_time:8.2f}s {batch / len(X_test) * 1000 * 1000:11.2f} ms "
+                  f"{single * 1000:8.2f} ms {size:7.2f} MB {auc:9.4f}")
+
+
+if __name__ == "__main__":
+    main()
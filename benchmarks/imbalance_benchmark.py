@@ -0,0 +1,55 @@
+"""
+Compares the imbalance strategies of the training pipelines: fit time of a cross-validated pipeline, number of rows
+the estimator is trained on and cross-validated ROC-AUC. The estimators keep their default parameters.
+
+Usage:
+    python -m benchmarks.imbalance_benchmark --rows 100000 --models xgb,lgbm
+"""
+import argparse
+import time
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold, cross_validate
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.imbalance import ImbalanceStrategy, apply_imbalance_strategy
+from src.pipeline.train import build_model_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the imbalance strategies.")
+    parser.add_argument("--rows", help="Number of training rows", type=int, default=100_000)
+    parser.add_argument("--models", help="Comma-separated model families", type=str, default='xgb,lgbm')
+    parser.add_argument("--folds", help="Number of cross-validation folds", type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_survey_data(args.rows)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    cv = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=42)
+
+    print(f"{'model':<8} {'strategy':<18} {'fit/fold':>9} {'resample':>9} {'rows':>8} {'roc auc':>8}")
+    for model in args.models.split(','):
+        for strategy in ImbalanceStrategy:
+            search = build_model_pipeline(model)
+            apply_imbalance_strategy(search, strategy, y)
+            pipeline = search.estimator
+
+            start = time.perf_counter()
+            scores = cross_validate(pipeline, X, y, cv=cv, scoring='roc_auc')
+            elapsed = (time.perf_counter() - start) / args.folds
+
+            # Time and output of the resampling step alone, on the whole data
+            sampler = pipeline.steps[-2][1]
+            resamples = hasattr(sampler, 'fit_resample')
+            Xt = pipeline[:-2 if resamples else -1].fit_transform(X, y)
+            resample_time, rows = 0.0, len(Xt)
+            if resamples:
+                start = time.perf_counter()
+                rows = len(sampler.fit_resample(Xt, y)[0])
+                resample_time = time.perf_counter() - start
+            print(f"{model:<8} {strategy.value:<18} {elapsed:8.2f}s {resample_time:8.2f}s {rows:>8} "
+                  f"{np.mean(scores['test_score']):8.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares scoring through an exported `InferencePlan` against running the fitted pipeline's transformers:
+single-record latency and batch throughput. The plan is first verified bit for bit against the pipeline.
+
+Usage:
+    python -m benchmarks.inference_plan_benchmark --rows 100000
+"""
+import argparse
+import time
+
+import numpy as np
+from imblearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.base_pipeline import get_base_pipeline_steps
+from src.pipeline.inference_plan import compile_inference_plan, verify_inference_plan
+
+
+def _latencies(func, frames):
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        func(frame)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies)
+
+
+def _best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled inference plan.")
+    parser.add_argument("--rows", help="Number of rows scored in one batch", type=int, default=100_000)
+    parser.add_argument("--records", help="Number of single-record calls", type=int, default=500)
+    parser.add_argument("--repeat", help="Number of timed batch runs (best is reported)", type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_survey_data(20_000)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    pipeline = Pipeline(get_base_pipeline_steps() + [('xgb', XGBClassifier(n_estimators=200))]).fit(X, y)
+
+    test = make_survey_data(args.rows, seed=0, with_target=False)
+    plan = compile_inference_plan(pipeline)
+    verify_inference_plan(plan, pipeline, test)
+    estimator = pipeline.steps[-1][1]
+
+    def plan_predict_proba(frame):
+        return estimator.predict_proba(plan.transform(frame))
+
+    records = [test.iloc[[i]] for i in range(args.records)]
+    print(f"{'':<10} {'record p50':>12} {'record p99':>12} {f'{args.rows:,} rows':>14}")
+    for name, predict_proba in [('pipeline', pipeline.predict_proba), ('plan', plan_predict_proba)]:
+        p50, p99 = np.percentile(_latencies(predict_proba, records), [50, 99]) * 1000
+        batch = _best_time(lambda: predict_proba(test), args.repeat)
+        print(f"{name:<10} {p50:9.2f} ms {p99:9.2f} ms {batch:12.3f} s")
+
+
+if __name__ == "__main__":
+    main()
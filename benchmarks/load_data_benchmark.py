@@ -0,0 +1,52 @@
+"""
+Compares parsing the raw CSV with cold (building) and warm (memory-mapped) loads
+through the columnar cache used by `utils.data.load_data`.
+
+Usage:
+    python -m benchmarks.load_data_benchmark --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_survey_data
+from src.data.data_preprocessing import RAW_DTYPES
+from utils.data import read_csv_cached
+
+
+def _time(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV parsing against the columnar cache.")
+    parser.add_argument("--rows", help="Number of rows to generate", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'train.csv')
+        cache_path = os.path.join(tmp_dir, 'cache')
+        make_survey_data(args.rows).to_csv(file_path, index=False)
+
+        timings = {
+            'read_csv': _time(lambda: pd.read_csv(file_path, dtype=RAW_DTYPES)),
+            'cache, cold': _time(lambda: read_csv_cached(file_path, cache_path, dtype=RAW_DTYPES)),
+            'cache, warm': _time(lambda: read_csv_cached(file_path, cache_path, dtype=RAW_DTYPES)),
+            'cache, warm, 3 columns': _time(lambda: read_csv_cached(file_path, cache_path, dtype=RAW_DTYPES,
+                                                                    columns=['Age', 'City', 'Depression'])),
+        }
+        # Touching the file forces a hash check but not a rebuild
+        os.utime(file_path)
+        timings['cache, touched'] = _time(lambda: read_csv_cached(file_path, cache_path, dtype=RAW_DTYPES))
+
+    for name, elapsed in timings.items():
+        print(f"{name:<24} {elapsed:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
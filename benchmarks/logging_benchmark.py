@@ -0,0 +1,72 @@
+"""
+Measures what logging costs the transform of a fitted preprocessor on single-record batches, as in serving: the
+per-batch messages written synchronously to the console and a file on the calling thread, queued to the listener
+thread at the HOT_PATH level, and dropped at the default INFO level. The log messages go to stderr.
+
+Usage:
+    python -m benchmarks.logging_benchmark --calls 2000 2> /dev/null
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import colorlog
+import numpy as np
+
+from benchmarks.synthetic import make_survey_data
+from src.data import data_preprocessing
+from src.transformers.preprocessors import DataPreprocessor
+from utils.logger import HOT_PATH
+
+
+def _time_transforms(preprocessor: DataPreprocessor, records, calls: int) -> np.ndarray:
+    latencies = np.empty(calls)
+    for i in range(calls):
+        record = records.iloc[[i % len(records)]]
+        start = time.perf_counter()
+        preprocessor.transform(record)
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+def _synchronous_handlers(log_dir: str):
+    """The handlers every logger had before the logging queue, writing on the calling thread"""
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(colorlog.ColoredFormatter('[%(levelname)s] %(asctime)s: %(name)s - %(message)s',
+                                                           datefmt='%Y-%m-%d %H:%M:%S'))
+    file_handler = logging.FileHandler(os.path.join(log_dir, 'synchronous.log'))
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    return [console_handler, file_handler]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the logging on the transform hot path.")
+    parser.add_argument("--calls", help="Number of single-record transforms per setup", type=int, default=2000)
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp()
+    data = make_survey_data(10_000).drop(columns=['Depression'])
+    preprocessor = DataPreprocessor().fit(data)
+    records = data.sample(500, random_state=0)
+    logger = data_preprocessing.logger
+    queue_handlers = list(logger.handlers)
+
+    setups = [
+        ('synchronous', _synchronous_handlers(log_dir), HOT_PATH),
+        ('queued', queue_handlers, HOT_PATH),
+        ('dropped', queue_handlers, logging.INFO),
+    ]
+    print(f"{'logging':<12} {'mean':>9} {'p50':>9} {'p99':>9}")
+    for name, handlers, level in setups:
+        logger.handlers = handlers
+        logger.setLevel(level)
+        _time_transforms(preprocessor, records, 50)
+        latencies = _time_transforms(preprocessor, records, args.calls) * 1e6
+        print(f"{name:<12} {latencies.mean():7.0f}us {np.percentile(latencies, 50):7.0f}us "
+              f"{np.percentile(latencies, 99):7.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Measures the peak memory allocated by `preprocess_data` relative to the size of its input
+(including string objects), with and without in-place preprocessing.
+
+Usage:
+    python -m benchmarks.preprocessing_memory_benchmark --rows 1000000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_survey_data
+from src.data.data_preprocessing import preprocess_data
+
+
+def _measure(rows, inplace):
+    # Tracing slows down allocations, so time and memory are measured on separate runs
+    data = make_survey_data(rows, with_target=False)
+    start = time.perf_counter()
+    preprocess_data(data, inplace=inplace)
+    elapsed = time.perf_counter() - start
+
+    data = make_survey_data(rows, with_target=False)
+    input_size = data.memory_usage(deep=True).sum()
+    tracemalloc.start()
+    preprocess_data(data, inplace=inplace)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, input_size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing peak memory.")
+    parser.add_argument("--rows", help="Number of rows to generate", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    for inplace in (False, True):
+        elapsed, input_size, peak = _measure(args.rows, inplace)
+        print(f"inplace={str(inplace):<5}  input {input_size / 2 ** 20:8.1f} MiB  "
+              f"peak {peak / 2 ** 20:8.1f} MiB  ({peak / input_size:.2f}x input)  {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
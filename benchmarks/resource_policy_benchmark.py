@@ -0,0 +1,75 @@
+"""
+Compares the throughput of a hyperparameter search under different splits of the cores between parallel fits
+and the threads of each fit, next to the unmanaged setup: n_jobs=-1 around estimators using every core.
+
+Usage:
+    python -m benchmarks.resource_policy_benchmark --model xgb --candidates 16
+"""
+import argparse
+import time
+from contextlib import nullcontext
+
+from imblearn.pipeline import Pipeline
+from lightgbm import LGBMClassifier
+from sklearn.ensemble import RandomForestClassifier
+from xgboost import XGBClassifier
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.base_pipeline import get_base_pipeline_steps
+from src.validation.grid_search import SearchStrategy, build_grid_search_cv, cached_pipeline_steps
+from utils.resources import ResourcePolicy, available_cores
+
+ESTIMATORS = {
+    'xgb': (XGBClassifier, {'xgb__n_estimators': [100, 200], 'xgb__max_depth': [3, 5, 7],
+                            'xgb__learning_rate': [0.05, 0.1, 0.2]}),
+    'lgbm': (lambda: LGBMClassifier(verbose=-1), {'lgbm__n_estimators': [100, 200], 'lgbm__num_leaves': [15, 31, 63],
+                                                  'lgbm__learning_rate': [0.05, 0.1, 0.2]}),
+    'rf': (RandomForestClassifier, {'rf__n_estimators': [100, 200], 'rf__max_depth': [None, 10, 20],
+                                    'rf__min_samples_leaf': [1, 2, 4]}),
+}
+
+
+def _search(model: str, n_candidates: int, policy: ResourcePolicy, unmanaged: bool):
+    estimator, param_grid = ESTIMATORS[model]
+    pipeline = Pipeline(get_base_pipeline_steps() + [(model, estimator())])
+    search = build_grid_search_cv(pipeline, param_grid, cv=3, verbose=0, search=SearchStrategy.RANDOM,
+                                  budget=n_candidates, policy=policy)
+    if unmanaged:
+        search.n_jobs = -1
+        search.estimator.steps[-1] = (model, estimator())
+    return search
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark core splits between parallel fits and threads.")
+    parser.add_argument("--model", help="Estimator of the search", choices=list(ESTIMATORS), default='xgb')
+    parser.add_argument("--rows", help="Number of training rows", type=int, default=50_000)
+    parser.add_argument("--candidates", help="Number of parameter combinations", type=int, default=16)
+    parser.add_argument("--cores", help="Number of cores, all available ones by default", type=int)
+    args = parser.parse_args()
+
+    data = make_survey_data(args.rows)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    n_cores = args.cores or available_cores()
+
+    splits = [(None, True)]
+    inner_threads = 1
+    while inner_threads <= n_cores:
+        splits.append((ResourcePolicy(n_cores, inner_threads), False))
+        inner_threads *= 2
+
+    print(f"{'setup':<34} {'time':>9} {'fits/s':>8}")
+    for policy, unmanaged in splits:
+        search = _search(args.model, args.candidates, policy or ResourcePolicy(n_cores), unmanaged)
+        start = time.perf_counter()
+        with cached_pipeline_steps(search), nullcontext() if unmanaged else policy.limits():
+            search.fit(X, y)
+        elapsed = time.perf_counter() - start
+        n_fits = args.candidates * 3 + 1
+        name = ('unmanaged, n_jobs=-1' if unmanaged
+                else f'{policy.outer_jobs} fits x {policy.inner_threads} threads')
+        print(f"{name:<34} {elapsed:8.2f}s {n_fits / elapsed:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measures the request latency and throughput of the scoring server for single-record requests sent by
+concurrent clients, with and without micro-batching, next to calling the fitted pipeline once per record.
+
+Usage:
+    python -m benchmarks.serving_benchmark --clients 32 --requests 100
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+from imblearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.base_pipeline import get_base_pipeline_steps
+from src.pipeline.inference_plan import compile_inference_plan
+from src.pipeline.serving import MicroBatcher, ScoringModel, ScoringServer
+
+
+async def _client(port: int, records, latencies):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for record in records:
+        body = json.dumps(record).encode()
+        start = time.perf_counter()
+        writer.write(f'POST /predict HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+        await writer.drain()
+        status = await reader.readline()
+        assert b' 200 ' in status, status
+        headers = {}
+        while (line := await reader.readline()) != b'\r\n':
+            name, _, value = line.decode().partition(':')
+            headers[name.lower()] = value.strip()
+        await reader.readexactly(int(headers['content-length']))
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def _run_server(model, records, n_clients, max_batch_size, max_delay):
+    server = ScoringServer(MicroBatcher(model, max_batch_size=max_batch_size, max_delay=max_delay))
+    listener = await server.start(port=0)
+    port = listener.sockets[0].getsockname()[1]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, records[i::n_clients], latencies) for i in range(n_clients)))
+    elapsed = time.perf_counter() - start
+    listener.close()
+    await server.batcher.stop()
+    return elapsed, np.array(latencies), server.latency.summary()
+
+
+def _report(name, elapsed, latencies):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"{name:<38} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  {len(latencies) / elapsed:8.0f} records/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring server.")
+    parser.add_argument("--clients", help="Number of concurrent clients", type=int, default=32)
+    parser.add_argument("--requests", help="Number of requests sent by each client", type=int, default=100)
+    parser.add_argument("--batch-delay-ms", help="Micro-batching delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    data = make_survey_data(20_000)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    pipeline = Pipeline(get_base_pipeline_steps() + [('xgb', XGBClassifier(n_estimators=200))]).fit(X, y)
+
+    n_records = args.clients * args.requests
+    test = make_survey_data(n_records, seed=0, with_target=False)
+    records = json.loads(test.to_json(orient='records'))
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(min(n_records, 500)):
+        record_start = time.perf_counter()
+        pipeline.predict_proba(test.iloc[[i]])
+        latencies.append(time.perf_counter() - record_start)
+    _report('pipeline, one record per call', time.perf_counter() - start, np.array(latencies))
+
+    models = {'': ScoringModel(pipeline), ', plan': ScoringModel(pipeline, compile_inference_plan(pipeline))}
+    # One client without batching gives the single-record latency of the server
+    for suffix, model in models.items():
+        for name, n_clients, max_batch_size in [('server, 1 client', 1, 1),
+                                                (f'server, {args.clients} clients, no batching', args.clients, 1),
+                                                (f'server, {args.clients} clients, batching', args.clients, 64)]:
+            client_records = records[:args.requests] if n_clients == 1 else records
+            elapsed, latencies, _ = asyncio.run(_run_server(model, client_records, n_clients, max_batch_size,
+                                                            args.batch_delay_ms / 1000))
+            _report(name + suffix, elapsed, latencies)
+
+
+if __name__ == "__main__":
+    main()
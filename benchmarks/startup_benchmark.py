@@ -0,0 +1,108 @@
+"""
+Measures the startup of short-lived commands in fresh interpreters with `python -X importtime`: the import time of
+the modules each command loads, the model libraries among them, and the wall time of scoring rows with a saved
+model, from interpreter start to predictions.
+
+Usage:
+    python -m benchmarks.startup_benchmark --repeat 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from imblearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from benchmarks.synthetic import make_survey_data
+from src.pipeline.base_pipeline import get_base_pipeline_steps
+from src.pipeline.options import ImbalanceStrategy
+from utils.artifacts import ArtifactFormat, save_artifact
+
+MODEL_LIBRARIES = ['xgboost', 'lightgbm', 'catboost', 'imblearn', 'sklearn', 'pandas']
+
+# Imports of each command of main.py, up to the point where it starts working
+COMMANDS = {
+    'parse arguments': "import main",
+    'evaluate': "import main; from src.pipeline.train import evaluate_model",
+    'serve': "import main; from src.pipeline.serving import serve",
+    'train xgb': "import main; from src.pipeline.train import build_model_pipeline; build_model_pipeline('xgb')",
+}
+
+SCORE = """
+import main
+import pandas as pd
+from src.data.data_preprocessing import RAW_DTYPES
+from utils.artifacts import load_artifact
+model = load_artifact({model_file!r})
+model.predict(pd.read_csv({data_file!r}, dtype=RAW_DTYPES))
+"""
+
+
+def _run(code: str, log_dir: str) -> Tuple[float, Dict[str, float]]:
+    """
+    Runs the code in a fresh interpreter, returns its wall time and the cumulative import time of every module.
+    The modules imported by the code itself are listed under their name, the others under an indented name.
+    """
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), MIND_MATTERS_LOG_DIR=log_dir)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, capture_output=True,
+                            text=True, check=True)
+    elapsed = time.perf_counter() - start
+    imports = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and not line.endswith('package'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            imports[name.rstrip()[1:]] = int(cumulative) / 1e6
+    return elapsed, imports
+
+
+def _libraries(imports: Dict[str, float]) -> str:
+    names = {name.strip() for name in imports}
+    return ', '.join(library for library in MODEL_LIBRARIES if library in names) or '-'
+
+
+def _slowest(imports: Dict[str, float], count: int) -> List[Tuple[str, float]]:
+    """Packages taking the longest to import, wherever they are imported from"""
+    packages = {}
+    for name, seconds in imports.items():
+        package = name.strip().split('.')[0]
+        packages[package] = max(packages.get(package, 0.0), seconds)
+    return sorted(packages.items(), key=lambda item: -item[1])[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the command line.")
+    parser.add_argument("--repeat", help="Runs of each command, the fastest is reported", type=int, default=3)
+    parser.add_argument("--rows", help="Rows scored with the saved model", type=int, default=1000)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    print(f"{'command':<16} {'wall':>7} {'imports':>8}  model libraries")
+    for command, code in COMMANDS.items():
+        elapsed, imports = min((_run(code, work_dir) for _ in range(args.repeat)), key=lambda run: run[0])
+        total = sum(seconds for name, seconds in imports.items() if not name.startswith(' '))
+        print(f"{command:<16} {elapsed:6.2f}s {total:7.2f}s  {_libraries(imports)}")
+        print(f"{'':<16} slowest: " + ', '.join(f'{name} {seconds:.2f}s' for name, seconds in _slowest(imports, 4)))
+
+    # A short-lived scoring invocation: start, import, load a saved model and score a few rows
+    data = make_survey_data(5_000)
+    X, y = data.drop(columns=['Depression']), data['Depression']
+    steps = get_base_pipeline_steps(ImbalanceStrategy.CLASS_WEIGHT)
+    model = Pipeline(steps + [('xgb', XGBClassifier(n_estimators=100))]).fit(X, y)
+    model_file = os.path.join(work_dir, 'xgb.joblib')
+    save_artifact(model, model_file, ArtifactFormat.COMPRESSED)
+    data_file = os.path.join(work_dir, 'rows.csv')
+    X.head(args.rows).to_csv(data_file, index=False)
+
+    code = SCORE.format(model_file=model_file, data_file=data_file)
+    elapsed, imports = min((_run(code, work_dir) for _ in range(args.repeat)), key=lambda run: run[0])
+    total = sum(seconds for name, seconds in imports.items() if not name.startswith(' '))
+    print(f"{f'score {args.rows} rows':<16} {elapsed:6.2f}s {total:7.2f}s  {_libraries(imports)}")
+
+
+if __name__ == "__main__":
+    main()
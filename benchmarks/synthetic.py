@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+
+def make_survey_data(n_rows: int, seed: int = 42, with_target: bool = True) -> pd.DataFrame:
+    """
+    Generates a synthetic frame with the same schema as the raw competition data.
+
+    Parameters:
+        n_rows (int): Number of rows to generate
+        seed (int): Random seed
+        with_target (bool): Whether to include the 'Depression' column
+
+    Returns:
+        pd.DataFrame: Synthetic survey data.
+    """
+    rng = np.random.default_rng(seed)
+    is_student = rng.random(n_rows) < 0.2
+
+    def sample(values, p=None):
+        return rng.choice(np.array(values, dtype=object), size=n_rows, p=p)
+
+    def with_rare(values, prefix):
+        # Unique values stay below any frequency threshold whatever the number of rows
+        rare_rows = rng.random(n_rows) < 0.002
+        values = values.copy()
+        values[rare_rows] = [f'{prefix} {i}' for i in range(rare_rows.sum())]
+        return values
+
+    def scale(values, mask):
+        return np.where(mask, sample(values), np.nan).astype(float)
+
+    data = pd.DataFrame({
+        'id': np.arange(n_rows),
+        'Name': sample(['Aarav', 'Ishani', 'Vikram', 'Ananya']),
+        'Gender': sample(['Male', 'Female']),
+        'Age': rng.integers(18, 61, n_rows).astype(float),
+        'City': with_rare(sample(['Ludhiana', 'Varanasi', 'Visakhapatnam', 'Mumbai', 'Kanpur', 'Pune']), 'City'),
+        'Working Professional or Student': np.where(is_student, 'Student', 'Working Professional'),
+        'Profession': np.where(is_student, np.nan,
+                               with_rare(sample(['Chef', 'Teacher', 'Business Analyst', 'Doctor', np.nan],
+                                                [0.2, 0.3, 0.2, 0.1, 0.2]), 'Profession')),
+        'Academic Pressure': scale([1., 2., 3., 4., 5.], is_student),
+        'Work Pressure': scale([1., 2., 3., 4., 5.], ~is_student),
+        'CGPA': np.where(is_student, rng.uniform(5, 10, n_rows).round(2), np.nan),
+        'Study Satisfaction': scale([1., 2., 3., 4., 5.], is_student),
+        'Job Satisfaction': scale([1., 2., 3., 4., 5.], ~is_student),
+        'Sleep Duration': with_rare(sample(['5-6 hours', '7-8 hours', 'Less than 5 hours', 'More than 8 hours']),
+                                    'Sleep'),
+        'Dietary Habits': with_rare(sample(['Healthy', 'Moderate', 'Unhealthy', np.nan], [0.33, 0.33, 0.33, 0.01]),
+                                    'Diet'),
+        'Degree': with_rare(sample(['B.Tech', 'MBA', 'Class 12', 'BSc', np.nan], [0.3, 0.2, 0.2, 0.298, 0.002]),
+                            'Degree'),
+        'Have you ever had suicidal thoughts ?': sample(['Yes', 'No']),
+        'Work/Study Hours': sample([float(hours) for hours in range(13)]).astype(float),
+        'Financial Stress': sample([1., 2., 3., 4., 5., np.nan], [0.2, 0.2, 0.2, 0.2, 0.199, 0.001]).astype(float),
+        'Family History of Mental Illness': sample(['Yes', 'No']),
+    })
+
+    if with_target:
+        logit = 1.5 * (data['Have you ever had suicidal thoughts ?'] == 'Yes') - (data['Age'] - 35) / 10
+        data['Depression'] = (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(int)
+
+    return data
@@ -1,24 +1,112 @@
 import argparse
 
-from src.pipeline.train import train_and_evaluate, evaluate_model
+# Only the options are imported here, every command imports the modules it runs and, through the model family
+# registry, the libraries of the models it trains or loads
+from src.pipeline.options import ImbalanceStrategy, SearchStrategy, ThresholdObjective
+from src.pipeline.registry import MODEL_FAMILIES
+from utils.artifacts import ArtifactFormat
+from utils.logger import configure_logging
 
 
 def main():
     parser = argparse.ArgumentParser(description="Train and evaluate models.")
-    parser.add_argument("--train", help="Train a model (e.g., --train xgb)", type=str)
+    parser.add_argument("--train", help="Train models (e.g., --train xgb, --train xgb,lgbm or --train all), "
+                                        f"among {', '.join(MODEL_FAMILIES)}", type=str)
     parser.add_argument("--evaluate", help="Evaluate a model (e.g., --evaluate xgb)", type=str)
+    parser.add_argument("--serve", help="Serve a model's predictions over HTTP (e.g., --serve xgb)", type=str)
+    parser.add_argument("--export-plan", help="Export the inference plan of a model (e.g., --export-plan xgb)",
+                        type=str)
+    parser.add_argument("--stack", help="Fit a stacking ensemble of saved models on their out-of-fold predictions "
+                                        "(e.g., --stack xgb,lgbm:3.0,catboost)", type=str)
+    parser.add_argument("--oof", help="Save the out-of-fold predictions of the trained models for --stack",
+                        action="store_true")
+    parser.add_argument("--incremental", help="Update the latest saved version of the trained models with the new "
+                                              "labelled rows of this CSV file in data/raw instead of training them "
+                                              "from scratch (e.g., --train xgb --incremental new_rows.csv)", type=str)
+    parser.add_argument("--rounds", help="Boosting rounds added on the new rows by --incremental", type=int,
+                        default=50)
+    parser.add_argument("--convert", help="Rewrite a saved model in another artifact format (e.g., --convert xgb)",
+                        type=str)
     parser.add_argument("--save", help="Save the trained model", action="store_true")
-    parser.add_argument("--version", help="Specify model version for evaluation", type=float)
+    parser.add_argument("--version", help="Model version, by default the next one when training and the latest one "
+                                          "otherwise", type=float)
     parser.add_argument("--verbose", help="Set verbosity level during training", type=int, default=1)
+    parser.add_argument("--log-level", help="Logging level, hot_path also logs every transformed batch", type=str,
+                        default='info', choices=['debug', 'hot_path', 'info', 'warning', 'error'])
+    parser.add_argument("--search", help="Hyperparameter search strategy", type=str, default='grid',
+                        choices=[strategy.value for strategy in SearchStrategy])
+    parser.add_argument("--budget", help="Number of parameter combinations sampled by random/halving search",
+                        type=int)
+    parser.add_argument("--chunksize", help="Score the test data in chunks of this many rows", type=int)
+    parser.add_argument("--n-jobs", help="Number of processes used to score chunks in parallel, or number of cores "
+                                          "used for training (default: MIND_MATTERS_N_CORES or all)", type=int)
+    parser.add_argument("--inner-threads", help="Threads of each model fit during training, the remaining cores "
+                                                "fit in parallel (default: MIND_MATTERS_INNER_THREADS or 1)", type=int)
+    parser.add_argument("--port", help="Port the server listens on", type=int, default=8000)
+    parser.add_argument("--socket", help="Unix socket the server listens on instead of the port", type=str)
+    parser.add_argument("--batch-delay-ms", help="Milliseconds the server waits to batch requests together",
+                        type=float, default=2.0)
+    parser.add_argument("--early-stopping", help="Train boosted models with early stopping after this many rounds "
+                                                 "without improvement instead of searching the number of rounds",
+                        type=int)
+    parser.add_argument("--imbalance", help="How the class imbalance is handled while training", type=str,
+                        default=ImbalanceStrategy.SMOTE.value, choices=[strategy.value for strategy in ImbalanceStrategy])
+    parser.add_argument("--threshold", help="Tune the decision threshold of the trained models for this objective on "
+                                            "out-of-fold predictions and save it with them", type=str,
+                        choices=[objective.value for objective in ThresholdObjective])
+    parser.add_argument("--target-recall", help="Recall of the positive class reached by --threshold recall",
+                        type=float, default=0.9)
+    parser.add_argument("--plan", help="Serve through the model's exported inference plan", action="store_true")
+    parser.add_argument("--artifact-format", help="Format models are saved in", type=str,
+                        default=ArtifactFormat.COMPRESSED.value, choices=[fmt.value for fmt in ArtifactFormat])
 
     args = parser.parse_args()
+    configure_logging(args.log_level)
 
     if args.train:
-        train_and_evaluate(args.train, args.version)
+        from src.pipeline.train import train_and_evaluate, train_incremental, train_models
+        from utils.resources import ResourcePolicy
+
+        models = list(MODEL_FAMILIES) if args.train == 'all' else args.train.split(',')
+        policy = ResourcePolicy(args.n_jobs, args.inner_threads)
+        threshold_objective = ThresholdObjective(args.threshold) if args.threshold else None
+        if args.incremental:
+            for model in models:
+                train_incremental(model, args.incremental, args.version, args.rounds,
+                                  ArtifactFormat(args.artifact_format))
+        elif len(models) == 1:
+            train_and_evaluate(models[0], args.version, SearchStrategy(args.search), args.budget,
+                               ArtifactFormat(args.artifact_format), policy, args.early_stopping,
+                               ImbalanceStrategy(args.imbalance), threshold_objective, args.target_recall, args.oof)
+        else:
+            train_models(models, args.version, SearchStrategy(args.search), args.budget,
+                         ArtifactFormat(args.artifact_format), policy, args.early_stopping,
+                         ImbalanceStrategy(args.imbalance), threshold_objective, args.target_recall, args.oof)
+    elif args.stack:
+        from src.pipeline.train import stack_models
+
+        stack_models(args.stack.split(','), args.version)
     elif args.evaluate:
-        evaluate_model(args.evaluate, args.version)
+        from src.pipeline.train import evaluate_model
+
+        evaluate_model(args.evaluate, args.version, args.chunksize, args.n_jobs)
+    elif args.serve:
+        from src.pipeline.serving import serve
+        from utils.helpers import get_model_file
+
+        serve(get_model_file(args.serve, args.version), port=args.port, unix_socket=args.socket,
+              max_delay=args.batch_delay_ms / 1000, use_plan=args.plan)
+    elif args.export_plan:
+        from src.pipeline.inference_plan import export_inference_plan
+        from utils.helpers import get_model_file
+
+        export_inference_plan(get_model_file(args.export_plan, args.version))
+    elif args.convert:
+        from utils.helpers import convert_model, get_model_file
+
+        convert_model(get_model_file(args.convert, args.version), ArtifactFormat(args.artifact_format))
     else:
-        print("Error: Unsupported command. Use --train or --evaluate.")
+        print("Error: Unsupported command. Use --train, --stack, --evaluate, --serve, --export-plan or --convert.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,14 +1,29 @@
 from enum import Enum
-from typing import List
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
-from sklearn.impute import SimpleImputer
+from joblib import Parallel, delayed
 
-from utils.logger import get_logger
+from utils.logger import HOT_PATH, get_logger
 
+# Every transformed batch goes through these steps, their messages are logged at the HOT_PATH level
 logger = get_logger('Data Preprocessing')
 
 
+OUTLIER_COLUMNS = ['Profession', 'City', 'Sleep Duration', 'Dietary Habits', 'Degree']
+
+ORDINAL_COLUMNS = ['Academic Pressure', 'Work Pressure', 'Study Satisfaction',
+                   'Job Satisfaction', 'Work/Study Hours', 'Financial Stress']
+
+NOMINAL_COLUMNS = ['Gender', 'City', 'Working Professional or Student', 'Profession', 'Sleep Duration',
+                   'Dietary Habits', 'Degree', 'Have you ever had suicidal thoughts ?',
+                   'Family History of Mental Illness']
+
+# Reading the nominal columns as categoricals avoids materializing one string object per row
+RAW_DTYPES = {column: 'category' for column in NOMINAL_COLUMNS}
+
+
 class NumericImputationStrategy(Enum):
     MEAN = 'mean'
     MEDIAN = 'median'
@@ -20,153 +35,405 @@ class CategoricalImputationStrategy(Enum):
     NEW_CATEGORY = 'new_category'
 
 
+def _first_mode(values: pd.Series) -> Any:
+    """Returns the first mode of `values`, or NaN when the group is empty."""
+    mode = values.mode()
+    return mode.iloc[0] if not mode.empty else np.nan
+
+
+def _add_category(values: pd.Series, category: Any) -> pd.Series:
+    """Adds `category` to the categories of a categorical column so it can be assigned."""
+    if isinstance(values.dtype, pd.CategoricalDtype) and category not in values.cat.categories:
+        return values.cat.add_categories([category])
+    return values
+
+
+def _fill_missing_values(data: pd.DataFrame, column: str, fill_value: Any, mask: Optional[pd.Series]) -> None:
+    """Fills missing entries of `column` in place, restricted to the rows selected by `mask`."""
+    missing = data[column].isna()
+    if mask is not None:
+        missing &= mask
+    # A NaN fill value comes from an empty group and leaves nothing to fill
+    if missing.any() and not pd.isna(fill_value):
+        data[column] = _add_category(data[column], fill_value)
+        data.loc[missing, column] = fill_value
+
+
 def _handle_numeric_missing_values(data: pd.DataFrame,
                                    columns: List[str],
                                    strategy: NumericImputationStrategy = NumericImputationStrategy.MEAN,
-                                   fill_value: float = -1) -> pd.DataFrame:
+                                   fill_value: float = -1,
+                                   mask: Optional[pd.Series] = None) -> None:
     """
-    Handles missing numerical values in the dataset.
+    Handles missing numerical values in place.
 
     Parameters:
         data (pd.DataFrame): Input DataFrame
         columns (List[str]): List of column to impute
         strategy (NumericImputationStrategy): Strategy for imputation ('mean', 'median')
-
-    Returns:
-        pd.DataFrame: DataFrame with missing values handled.
+        fill_value (float): Value used by the 'NA' strategy
+        mask (Optional[pd.Series]): Boolean mask of the rows to impute, statistics are computed over these rows only
     """
-    # Create a copy
-    data = data.copy()
-    # Instantiate an imputer with provided strategy
-    if strategy == NumericImputationStrategy.NOT_APPLICABLE:
-        for column in columns:
-            data[column] = data[column].fillna(fill_value)
-    else:
-        imputer = SimpleImputer(strategy=strategy.value)
-        for column in columns:
-            data[[column]] = imputer.fit_transform(data[[column]])
-
-    return data
+    for column in columns:
+        if strategy == NumericImputationStrategy.NOT_APPLICABLE:
+            value = fill_value
+        else:
+            values = data[column] if mask is None else data.loc[mask, column]
+            value = values.agg(strategy.value)
+        _fill_missing_values(data, column, value, mask)
 
 
 def _handle_categorical_missing_values(data: pd.DataFrame,
                                        columns: List[str],
                                        strategy: CategoricalImputationStrategy = CategoricalImputationStrategy.NEW_CATEGORY,
-                                       category_name: str = None) -> pd.DataFrame:
+                                       category_name: str = None,
+                                       mask: Optional[pd.Series] = None) -> None:
     """
-    Handles missing values in categorical variables.
+    Handles missing values in categorical variables in place.
 
     Parameters:
         data (pd.DataFrame): Input DataFrame
         columns (List[str]): List of columns to impute
         strategy (CategoricalImputationStrategy): Strategy for imputation ('mode' or 'new_category')
+        category_name (str): Category used by the 'new_category' strategy
+        mask (Optional[pd.Series]): Boolean mask of the rows to impute, statistics are computed over these rows only
+    """
+    for column in columns:
+        if strategy == CategoricalImputationStrategy.MODE:
+            value = _first_mode(data[column] if mask is None else data.loc[mask, column])
+        elif category_name is not None:
+            value = category_name
+        else:
+            continue
+        _fill_missing_values(data, column, value, mask)
+
+
+def convert_data_types(data: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+    """
+    Converts the ordinal and nominal columns to the categorical dtype.
+
+    Ordinal columns keep their string labels ('1.0', '2.0', ...) as categories, so every row only
+    stores an integer code.
+
+    Parameters:
+        data (pd.DataFrame): Raw DataFrame
+        inplace (bool): Whether to modify `data` instead of a copy
 
     Returns:
-        pd.DataFrame: DataFrame with missing values handled.
+        pd.DataFrame: DataFrame with categorical columns.
     """
-    pd.set_option('future.no_silent_downcasting', True)
-    # Create a copy
-    data = data.copy()
-    if strategy.value == "mode":
-        for column in columns:
-            mode_value = data[column].mode()[0]
-            data[column] = data[column].astype(str).replace('nan', mode_value).astype('object')
-    elif strategy.value == "new_category" and category_name is not None:
-        data[columns] = data[columns].astype(str).replace('nan', category_name).astype('object')
+    logger.log(HOT_PATH, "Converting data types")
+    if not inplace:
+        data = data.copy()
+    for column in ORDINAL_COLUMNS:
+        values = data[column].astype('category')
+        data[column] = values.cat.rename_categories(values.cat.categories.astype(str))
+    for column in NOMINAL_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].astype('category')
+    logger.log(HOT_PATH, "Converting data types successful")
     return data
 
 
-def convert_data_types(data: pd.DataFrame) -> pd.DataFrame:
-    logger.info("Converting data types")
-    # Copy dataframe
-    data = data.copy()
-    columns_to_convert = ['Academic Pressure', 'Work Pressure', 'Study Satisfaction',
-                          'Job Satisfaction', 'Work/Study Hours', 'Financial Stress']
-    data[columns_to_convert] = data[columns_to_convert].astype(str)
-    logger.info("Converting data types successful")
-    return data
+def _value_counts(values: pd.Series) -> pd.Series:
+    """Counts of the observed values, in the order of the categories for a categorical column."""
+    counts = values.value_counts(sort=False, dropna=True)
+    if isinstance(counts.index, pd.CategoricalIndex):
+        counts.index = counts.index.astype(object)
+    return counts[counts > 0].astype(np.int64)
+
+
+def add_counts(counts: pd.Series, new_counts: pd.Series) -> pd.Series:
+    """Adds two value counts, the values first seen in `new_counts` come after the known ones."""
+    index = counts.index.append(new_counts.index.difference(counts.index, sort=False))
+    return counts.reindex(index, fill_value=0) + new_counts.reindex(index, fill_value=0)
 
 
-def handle_missing_values(data: pd.DataFrame) -> pd.DataFrame:
-    logger.info("Handling missing values")
-    # Copy dataframe
-    data = data.copy()
+def _mode_from_counts(counts: pd.Series) -> Any:
+    # Ties go to the first value, the first category as with `_first_mode`
+    return counts.idxmax() if not counts.empty else np.nan
+
+
+def _median_from_counts(counts: pd.Series) -> float:
+    if counts.empty:
+        return np.nan
+    counts = counts.sort_index()
+    cumulative = np.cumsum(counts.to_numpy())
+    values = counts.index.to_numpy(dtype=float)
+    # Values at the two middle positions, the same one for an odd number of values
+    middle = np.searchsorted(cumulative, [(cumulative[-1] - 1) // 2, cumulative[-1] // 2], side='right')
+    return float(values[middle].mean())
+
+
+def compute_imputation_counts(data: pd.DataFrame) -> Dict[str, pd.Series]:
+    """
+    Counts the values of every imputed column over the rows its fill value is computed from.
+
+    Counts of separate batches are summed with `add_counts`, so the fill values can be updated
+    with new rows without the rows already seen.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame returned by `convert_data_types`
+
+    Returns:
+        Dict[str, pd.Series]: Counts of the observed values of each imputed column.
+    """
+    students_mask = data['Working Professional or Student'] == 'Student'
+    working_professionals_mask = data['Working Professional or Student'] == 'Working Professional'
+
+    counts = {}
+    for column in ['CGPA', 'Academic Pressure', 'Study Satisfaction']:
+        counts[column] = _value_counts(data.loc[students_mask, column])
+    for column in ['Work Pressure', 'Job Satisfaction']:
+        counts[column] = _value_counts(data.loc[working_professionals_mask, column])
+    for column in ['Financial Stress', 'Dietary Habits', 'Degree']:
+        counts[column] = _value_counts(data[column])
+    return counts
+
+
+def imputation_values_from_counts(counts: Dict[str, pd.Series]) -> Dict[str, Any]:
+    """Fill values of `handle_missing_values` from the counts of `compute_imputation_counts`."""
+    return {column: _median_from_counts(values) if column == 'CGPA' else _mode_from_counts(values)
+            for column, values in counts.items()}
+
+
+def compute_imputation_values(data: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Computes the values used to fill missing entries in `handle_missing_values`.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame returned by `convert_data_types`
+
+    Returns:
+        Dict[str, Any]: Fill value for each imputed column.
+    """
+    return imputation_values_from_counts(compute_imputation_counts(data))
+
+
+def _fill_with_values(data: pd.DataFrame,
+                      imputation_values: Dict[str, Any],
+                      columns: List[str],
+                      mask: Optional[pd.Series] = None) -> None:
+    """Fills missing categorical values of each column with its precomputed value."""
+    for column in columns:
+        _handle_categorical_missing_values(data,
+                                           [column],
+                                           CategoricalImputationStrategy.NEW_CATEGORY,
+                                           imputation_values[column],
+                                           mask=mask)
+
+
+def handle_missing_values(data: pd.DataFrame,
+                          imputation_values: Optional[Dict[str, Any]] = None,
+                          inplace: bool = False) -> pd.DataFrame:
+    """
+    Handles missing values for students and working professionals.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame returned by `convert_data_types`
+        imputation_values (Optional[Dict[str, Any]]): Fill values learned by `compute_imputation_values`.
+            When None they are computed from `data`.
+        inplace (bool): Whether to modify `data` instead of a copy
+
+    Returns:
+        pd.DataFrame: DataFrame with missing values handled.
+    """
+    logger.log(HOT_PATH, "Handling missing values")
+    if imputation_values is None:
+        imputation_values = compute_imputation_values(data)
+    if not inplace:
+        data = data.copy()
     # Group data into students and working professional
-    students_data = data[data['Working Professional or Student'] == 'Student']
-    working_professionals_data = data[data['Working Professional or Student'] == 'Working Professional']
+    students_mask = data['Working Professional or Student'] == 'Student'
+    working_professionals_mask = data['Working Professional or Student'] == 'Working Professional'
     # handle missing values for CGPA
-    students_data = _handle_numeric_missing_values(students_data,
-                                                   ['CGPA'],
-                                                   strategy=NumericImputationStrategy.MEDIAN)
-    working_professionals_data = _handle_numeric_missing_values(working_professionals_data,
-                                                                ['CGPA'],
-                                                                strategy=NumericImputationStrategy.NOT_APPLICABLE,
-                                                                fill_value=-1)
+    _handle_numeric_missing_values(data,
+                                   ['CGPA'],
+                                   strategy=NumericImputationStrategy.NOT_APPLICABLE,
+                                   fill_value=imputation_values['CGPA'],
+                                   mask=students_mask)
+    _handle_numeric_missing_values(data,
+                                   ['CGPA'],
+                                   strategy=NumericImputationStrategy.NOT_APPLICABLE,
+                                   fill_value=-1,
+                                   mask=working_professionals_mask)
     # handle missing values for Academic Pressure and Study Satisfaction
-    working_professionals_data = _handle_categorical_missing_values(working_professionals_data,
-                                                                    ['Academic Pressure', 'Study Satisfaction'],
-                                                                    CategoricalImputationStrategy.NEW_CATEGORY,
-                                                                    'Not Applicable')
-    students_data = _handle_categorical_missing_values(students_data,
-                                                       ['Academic Pressure', 'Study Satisfaction'],
-                                                       CategoricalImputationStrategy.MODE)
+    _handle_categorical_missing_values(data,
+                                       ['Academic Pressure', 'Study Satisfaction'],
+                                       CategoricalImputationStrategy.NEW_CATEGORY,
+                                       'Not Applicable',
+                                       mask=working_professionals_mask)
+    _fill_with_values(data, imputation_values, ['Academic Pressure', 'Study Satisfaction'], mask=students_mask)
     # handle missing values for Work Pressure and Job Satisfaction
-    students_data = _handle_categorical_missing_values(students_data,
-                                                       ['Work Pressure', 'Job Satisfaction'],
-                                                       CategoricalImputationStrategy.NEW_CATEGORY,
-                                                       'Not Applicable')
-
-    working_professionals_data = _handle_categorical_missing_values(working_professionals_data,
-                                                                    ['Work Pressure', 'Job Satisfaction'],
-                                                                    CategoricalImputationStrategy.MODE)
-    # handle missing values for Profession and Degree
-    working_professionals_data = _handle_categorical_missing_values(working_professionals_data,
-                                                                    ['Profession'],
-                                                                    CategoricalImputationStrategy.NEW_CATEGORY,
-                                                                    'Unknown')
-    students_data = _handle_categorical_missing_values(students_data,
-                                                       ['Profession'],
-                                                       CategoricalImputationStrategy.NEW_CATEGORY,
-                                                       'Student')
-    # Update students and working professionals data
-    data.update(students_data)
-    data.update(working_professionals_data)
+    _handle_categorical_missing_values(data,
+                                       ['Work Pressure', 'Job Satisfaction'],
+                                       CategoricalImputationStrategy.NEW_CATEGORY,
+                                       'Not Applicable',
+                                       mask=students_mask)
+    _fill_with_values(data, imputation_values, ['Work Pressure', 'Job Satisfaction'], mask=working_professionals_mask)
+    # handle missing values for Profession
+    _handle_categorical_missing_values(data,
+                                       ['Profession'],
+                                       CategoricalImputationStrategy.NEW_CATEGORY,
+                                       'Unknown',
+                                       mask=working_professionals_mask)
+    _handle_categorical_missing_values(data,
+                                       ['Profession'],
+                                       CategoricalImputationStrategy.NEW_CATEGORY,
+                                       'Student',
+                                       mask=students_mask)
     # handle missing values for Financial Stress, Dietary Habits and Degree
-    data = _handle_categorical_missing_values(data,
-                                              ['Financial Stress', 'Dietary Habits', 'Degree'],
-                                              CategoricalImputationStrategy.MODE)
-    logger.info("Handling missing values successful!")
+    _fill_with_values(data, imputation_values, ['Financial Stress', 'Dietary Habits', 'Degree'])
+    logger.log(HOT_PATH, "Handling missing values successful!")
     return data
 
 
-def handle_outliers(data: pd.DataFrame, threshold: int = 20) -> pd.DataFrame:
-    logger.info("Handling outliers...")
-    # Copy the dataframe
-    data = data.copy()
-    columns_to_handle_outliers = ['Profession', 'City', 'Sleep Duration', 'Dietary Habits', 'Degree']
-    # Categories with fewer than this count will be replaced
-    for col in columns_to_handle_outliers:
-        # Get the frequency of each category
-        freq = data[col].value_counts()
-        # Identify categories to replace
-        infrequent_categories = freq[freq < threshold].index
-        # Replace infrequent categories with 'Other'
-        data[col] = data[col].apply(lambda category: 'Other' if category in infrequent_categories else category)
-    logger.info("Handling outliers successful!")
+def _replace_where(column: pd.Series, mask: np.ndarray, replacement: str) -> pd.Series:
+    """Replaces the values selected by `mask`, dropping the categories that are no longer used."""
+    if not mask.any():
+        return column
+    replaced = _add_category(column, replacement).mask(mask, replacement)
+    if isinstance(replaced.dtype, pd.CategoricalDtype):
+        replaced = replaced.cat.remove_unused_categories()
+    return replaced
+
+
+def _collapse_rare_categories(column: pd.Series, threshold: int, replacement: str = 'Other') -> pd.Series:
+    """
+    Replaces categories occurring fewer than `threshold` times with `replacement`.
+
+    The column is factorized once so frequencies come from a single `np.bincount` over the
+    integer codes instead of a per-row membership test.
+
+    Parameters:
+        column (pd.Series): Categorical column
+        threshold (int): Minimum count for a category to be kept
+        replacement (str): Value used for infrequent categories
+
+    Returns:
+        pd.Series: Column with infrequent categories replaced.
+    """
+    codes, _ = pd.factorize(column)
+    # Shift codes by one so missing values (-1) land in slot 0 and are never treated as rare
+    counts = np.bincount(codes + 1)
+    is_rare = counts < threshold
+    is_rare[0] = False
+    return _replace_where(column, is_rare[codes + 1], replacement)
+
+
+def _keep_frequent_categories(column: pd.Series,
+                              frequent_categories: np.ndarray,
+                              replacement: str = 'Other') -> pd.Series:
+    """Replaces every category outside the learned `frequent_categories` with `replacement`."""
+    return _replace_where(column, (column.notna() & ~column.isin(frequent_categories)).to_numpy(), replacement)
+
+
+def compute_category_counts(data: pd.DataFrame) -> Dict[str, pd.Series]:
+    """
+    Counts the categories of every column collapsed by `handle_outliers`.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame returned by `handle_missing_values`
+
+    Returns:
+        Dict[str, pd.Series]: Counts of the observed categories of each column, summed across batches
+        with `add_counts`.
+    """
+    return {col: _value_counts(data[col]) for col in OUTLIER_COLUMNS}
+
+
+def frequent_categories_from_counts(counts: Dict[str, pd.Series], threshold: int = 20) -> Dict[str, np.ndarray]:
+    """Categories kept by `handle_outliers`, from the counts of `compute_category_counts`."""
+    return {col: np.asarray(values.index[values >= threshold], dtype=object) for col, values in counts.items()}
+
+
+def compute_frequent_categories(data: pd.DataFrame, threshold: int = 20) -> Dict[str, np.ndarray]:
+    """
+    Computes the categories kept by `handle_outliers`.
+
+    Parameters:
+        data (pd.DataFrame): DataFrame returned by `handle_missing_values`
+        threshold (int): Categories with fewer than this count are not kept
+
+    Returns:
+        Dict[str, np.ndarray]: Frequent categories of each column.
+    """
+    return frequent_categories_from_counts(compute_category_counts(data), threshold)
+
+
+def handle_outliers(data: pd.DataFrame,
+                    threshold: int = 20,
+                    n_jobs: Optional[int] = None,
+                    frequent_categories: Optional[Dict[str, np.ndarray]] = None,
+                    inplace: bool = False) -> pd.DataFrame:
+    """
+    Collapses infrequent categories into 'Other'.
+
+    Parameters:
+        data (pd.DataFrame): Input DataFrame
+        threshold (int): Categories with fewer than this count will be replaced
+        n_jobs (Optional[int]): Number of threads used to process the columns in parallel.
+            None processes the columns sequentially.
+        frequent_categories (Optional[Dict[str, np.ndarray]]): Categories learned by `compute_frequent_categories`.
+            When provided, every other category is replaced and `threshold` is ignored.
+        inplace (bool): Whether to modify `data` instead of a copy
+
+    Returns:
+        pd.DataFrame: DataFrame with infrequent categories replaced.
+    """
+    logger.log(HOT_PATH, "Handling outliers...")
+    if not inplace:
+        data = data.copy()
+
+    def collapse(col):
+        if frequent_categories is None:
+            return _collapse_rare_categories(data[col], threshold)
+        return _keep_frequent_categories(data[col], frequent_categories[col])
+
+    if n_jobs is None:
+        collapsed = [collapse(col) for col in OUTLIER_COLUMNS]
+    else:
+        collapsed = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(collapse)(col) for col in OUTLIER_COLUMNS)
+    for col, values in zip(OUTLIER_COLUMNS, collapsed):
+        data[col] = values
+    logger.log(HOT_PATH, "Handling outliers successful!")
     return data
 
 
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
-    logger.info("Preprocessing data...")
-    # Create copy of data
-    df = df.copy()
-    # Drop unwanted features
-    df = df.drop(columns=['id', 'Name'], errors='ignore')
+def preprocess_data(df: pd.DataFrame,
+                    imputation_values: Optional[Dict[str, Any]] = None,
+                    frequent_categories: Optional[Dict[str, np.ndarray]] = None,
+                    inplace: bool = False) -> pd.DataFrame:
+    """
+    Cleans the raw survey data.
+
+    Every step works on boolean masks over a single frame, so at most one copy of `df` is made.
+
+    Parameters:
+        df (pd.DataFrame): Raw DataFrame
+        imputation_values (Optional[Dict[str, Any]]): Fill values learned by `compute_imputation_values`
+        frequent_categories (Optional[Dict[str, np.ndarray]]): Categories learned by `compute_frequent_categories`
+        inplace (bool): Whether to modify `df` instead of a copy
+
+    Statistics that are not provided are computed from `df` itself.
+
+    Returns:
+        pd.DataFrame: Preprocessed DataFrame.
+    """
+    logger.log(HOT_PATH, "Preprocessing data...")
+    # Drop unwanted features, this is the only copy made when not working in place
+    if inplace:
+        # `drop(inplace=True)` rebuilds the blocks, deleting the columns does not
+        for column in ['id', 'Name']:
+            if column in df.columns:
+                del df[column]
+    else:
+        df = df.drop(columns=['id', 'Name'], errors='ignore')
     # Convert data types
-    df = convert_data_types(df)
+    convert_data_types(df, inplace=True)
     # handle missing values
-    df = handle_missing_values(df)
+    handle_missing_values(df, imputation_values, inplace=True)
     # handle outliers
-    df = handle_outliers(df)
-    logger.info("Data preprocessing successful!")
+    handle_outliers(df, frequent_categories=frequent_categories, inplace=True)
+    logger.log(HOT_PATH, "Data preprocessing successful!")
     return df
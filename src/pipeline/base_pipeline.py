@@ -1,12 +1,14 @@
 from typing import List
-from imblearn.over_sampling import SMOTE
 
+import numpy as np
+
+from src.pipeline.imbalance import ImbalanceStrategy, build_imbalance_step
 from src.transformers.custom_transformers import ScaleNumericFeatures, GenerateInteractionFeatures
-from src.transformers.encoders import EncodeCategoricalFeatures
+from src.transformers.encoders import EncodeCategoricalFeatures, EncodedOutput
 from src.transformers.preprocessors import DataPreprocessor
 
 
-def get_base_pipeline_steps() -> List:
+def get_base_pipeline_steps(imbalance: ImbalanceStrategy = ImbalanceStrategy.SMOTE) -> List:
     one_hot_encoded_features = ['Working Professional or Student', 'Have you ever had suicidal thoughts ?',
                                 'Sleep Duration', 'Dietary Habits', 'Family History of Mental Illness', 'Gender']
 
@@ -15,14 +17,15 @@ def get_base_pipeline_steps() -> List:
     label_encoded_features = ['Academic Pressure', 'Work Pressure', 'Study Satisfaction', 'Job Satisfaction',
                               'Work/Study Hours', 'Financial Stress']
 
-    smote = SMOTE()
-
-    return [
+    steps = [
         ('preprocessor', DataPreprocessor()),
         ('scale_numeric', ScaleNumericFeatures()),
+        # From the encoder on, features are float32 arrays indexed by the slots of the encoder's schema
         ('encode_categorical', EncodeCategoricalFeatures(
-            one_hot_encoded_features, target_encoded_features, label_encoded_features
+            one_hot_encoded_features, target_encoded_features, label_encoded_features,
+            output=EncodedOutput.ARRAY, dtype=np.float32
         )),
         ('generate_interactions', GenerateInteractionFeatures()),
-        ('oversampling', smote)
     ]
+    imbalance_step = build_imbalance_step(imbalance)
+    return steps if imbalance_step is None else steps + [imbalance_step]
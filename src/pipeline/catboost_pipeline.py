@@ -1,19 +1,19 @@
 from catboost import CatBoostClassifier
-from sklearn.pipeline import Pipeline
+from imblearn.pipeline import Pipeline
 
 from src.pipeline.base_pipeline import get_base_pipeline_steps
-from src.validation.grid_search import build_grid_search_cv
+from src.pipeline.early_stopping import build_early_stopping_pipeline
+from src.validation.grid_search import SearchStrategy, build_grid_search_cv
 
 
-def build_catboost_pipeline():
+def build_catboost_pipeline(search: SearchStrategy = SearchStrategy.GRID, budget: int = None,
+                            early_stopping_rounds: int = None):
     catboost = CatBoostClassifier(verbose=False)
 
     base_pipeline_steps = get_base_pipeline_steps()
     # Add model to pipeline
     base_pipeline_steps.append(('catboost', catboost))
 
-    pipeline = Pipeline(base_pipeline_steps)
-
     catboost_param_grid = {
         'catboost__iterations': [100, 200, 300],
         'catboost__depth': [4, 6, 8],
@@ -21,4 +21,12 @@ def build_catboost_pipeline():
         'catboost__l2_leaf_reg': [1, 3, 5]
     }
 
-    return build_grid_search_cv(pipeline, catboost_param_grid)
+    if early_stopping_rounds is None:
+        pipeline = Pipeline(base_pipeline_steps)
+    else:
+        pipeline, catboost_param_grid = build_early_stopping_pipeline(base_pipeline_steps, catboost_param_grid,
+                                                                      'catboost__iterations', early_stopping_rounds,
+                                                                      search)
+
+    return build_grid_search_cv(pipeline, catboost_param_grid, search=search, budget=budget,
+                                resource='catboost__iterations')
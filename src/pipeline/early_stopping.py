@@ -0,0 +1,76 @@
+import inspect
+from typing import Dict, List, Tuple
+
+from imblearn.pipeline import Pipeline
+from sklearn.model_selection import train_test_split
+
+from src.validation.grid_search import SearchStrategy
+
+# Estimator parameter setting how many rounds without improvement on the validation split stop training
+PATIENCE_PARAMS = {'xgboost': 'early_stopping_rounds', 'lightgbm': 'early_stopping_round',
+                   'catboost': 'early_stopping_rounds'}
+
+
+class EarlyStoppingPipeline(Pipeline):
+    """
+    Pipeline whose boosted final estimator stops adding rounds once its loss on an inner validation split
+    stops improving.
+
+    The validation split is carved from the training data before any step is fitted. The steps are fitted
+    on the rest, the validation split is transformed through them, samplers excepted so it keeps the real
+    class balance, and it is passed to the estimator as its eval_set. The patience is the estimator's own
+    parameter, see `PATIENCE_PARAMS`.
+    """
+
+    def __init__(self, steps, *, validation_fraction=0.1, random_state=42, memory=None, verbose=False):
+        super().__init__(steps, memory=memory, verbose=verbose)
+        self.validation_fraction = validation_fraction
+        self.random_state = random_state
+
+    def fit(self, X, y=None, **params):
+        X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=self.validation_fraction, stratify=y,
+                                                      random_state=self.random_state)
+        routed_params = self._check_method_params(method="fit", props=params)
+        Xt, yt = self._fit(X_fit, y_fit, routed_params)
+        if self._final_estimator == 'passthrough':
+            return self
+
+        for _, step in self.steps[:-1]:
+            if step not in (None, 'passthrough') and hasattr(step, 'transform'):
+                X_val = step.transform(X_val)
+        estimator = self._final_estimator
+        fit_params = {**routed_params[self.steps[-1][0]]['fit'], 'eval_set': [(X_val, y_val)]}
+        # XGBoost logs the validation loss of every round by default
+        if 'verbose' in inspect.signature(estimator.fit).parameters:
+            fit_params.setdefault('verbose', False)
+        estimator.fit(Xt, yt, **fit_params)
+        return self
+
+
+def build_early_stopping_pipeline(steps: List, param_grid: Dict, rounds_param: str, early_stopping_rounds: int,
+                                  search: SearchStrategy = SearchStrategy.GRID) -> Tuple[EarlyStoppingPipeline, Dict]:
+    """
+    Wraps the steps of a boosted model in an `EarlyStoppingPipeline`.
+
+    The largest number of rounds in the grid becomes the estimator's cap and the rounds are removed
+    from the grid: early stopping picks the number of rounds of every candidate in a single fit.
+    Successive halving keeps the rounds as its resource, they cap each iteration's fits, which still
+    stop early.
+
+    Parameters:
+        steps (List): Pipeline steps, the booster last
+        param_grid (Dict): Parameter grid of the search
+        rounds_param (str): Grid parameter of the number of rounds, e.g. 'xgb__n_estimators'
+        early_stopping_rounds (int): Rounds without improvement on the validation split before stopping
+        search (SearchStrategy): Search the pipeline is tuned with
+
+    Returns:
+        Tuple[EarlyStoppingPipeline, Dict]: The pipeline and the grid without the rounds.
+    """
+    param_grid = dict(param_grid)
+    max_rounds = max(param_grid[rounds_param] if search == SearchStrategy.HALVING else param_grid.pop(rounds_param))
+    estimator = steps[-1][1]
+    library = type(estimator).__module__.split('.')[0]
+    estimator.set_params(**{rounds_param.split('__', 1)[1]: max_rounds,
+                            PATIENCE_PARAMS[library]: early_stopping_rounds})
+    return EarlyStoppingPipeline(steps), param_grid
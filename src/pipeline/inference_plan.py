@@ -0,0 +1,364 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data.data_preprocessing import ORDINAL_COLUMNS, OUTLIER_COLUMNS, RAW_DTYPES
+from src.transformers.custom_transformers import GenerateInteractionFeatures, ScaleNumericFeatures
+from src.transformers.encoders import EncodeCategoricalFeatures, _category_positions
+from src.transformers.feature_engineering import NO_MASK, STUDENT_MASK, WORKING_PROFESSIONAL_MASK
+from src.transformers.preprocessors import DataPreprocessor
+from utils.artifacts import ArtifactFormat, load_artifact, save_artifact
+from utils.data import load_data
+from utils.helpers import load_model
+from utils.logger import get_logger
+
+logger = get_logger("Inference Plan")
+
+plans_dir_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'models', 'plans'))
+
+GROUP_COLUMN = 'Working Professional or Student'
+STUDENT, WORKING_PROFESSIONAL, NO_GROUP = 0, 1, 2
+
+
+def _missing_value_fills(imputation_values: Dict[str, Any]) -> Dict[str, Dict[int, Any]]:
+    """Fill value of each categorical column per row group, mirroring `handle_missing_values`"""
+    fills = {
+        'Academic Pressure': {STUDENT: imputation_values['Academic Pressure'], WORKING_PROFESSIONAL: 'Not Applicable'},
+        'Study Satisfaction': {STUDENT: imputation_values['Study Satisfaction'],
+                               WORKING_PROFESSIONAL: 'Not Applicable'},
+        'Work Pressure': {STUDENT: 'Not Applicable', WORKING_PROFESSIONAL: imputation_values['Work Pressure']},
+        'Job Satisfaction': {STUDENT: 'Not Applicable', WORKING_PROFESSIONAL: imputation_values['Job Satisfaction']},
+        'Profession': {STUDENT: 'Student', WORKING_PROFESSIONAL: 'Unknown'},
+    }
+    for column in ['Financial Stress', 'Dietary Habits', 'Degree']:
+        fills[column] = dict.fromkeys([STUDENT, WORKING_PROFESSIONAL, NO_GROUP], imputation_values[column])
+    # A NaN fill value comes from an empty group and leaves the value missing
+    return {column: {group: value for group, value in column_fills.items() if not pd.isna(value)}
+            for column, column_fills in fills.items()}
+
+
+def _factorize(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct values of a column and the integer code of every row, -1 for missing values"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.categories.to_numpy(), values.cat.codes.to_numpy()
+    codes, uniques = pd.factorize(values)
+    return np.asarray(uniques), codes
+
+
+class CategoricalColumnPlan:
+    """
+    Maps a raw categorical column straight to its encoded values.
+
+    Every row is first assigned a slot, the index of the category the preprocessor leaves it with,
+    or the trailing slot when it ends up missing. `table` then holds the encoded value of every slot,
+    for one-hot encoded columns the output column set to one (-1 when the category cannot be encoded).
+    """
+
+    def __init__(self,
+                 name: str,
+                 encoding: str,
+                 string_keys: bool,
+                 slots: Dict[Any, int],
+                 unseen_slot: int,
+                 missing_slots: np.ndarray,
+                 table: np.ndarray,
+                 position: Optional[int] = None):
+        self.name = name
+        self.encoding = encoding
+        # Ordinal columns are matched on the string labels `convert_data_types` gives them
+        self.string_keys = string_keys
+        self.slots = slots
+        self.unseen_slot = unseen_slot
+        self.missing_slots = missing_slots
+        self.table = table
+        self.position = position
+
+    def row_slots(self, values: pd.Series, groups: np.ndarray) -> np.ndarray:
+        uniques, codes = _factorize(values)
+        keys = map(str, uniques) if self.string_keys else uniques
+        lookup = np.fromiter((self.slots.get(key, self.unseen_slot) for key in keys), dtype=np.intp,
+                             count=len(uniques))
+        slots = np.append(lookup, 0)[codes]
+        missing = codes < 0
+        slots[missing] = self.missing_slots[groups[missing]]
+        return slots
+
+    def write(self, values: np.ndarray, column: pd.Series, groups: np.ndarray) -> None:
+        encoded = self.table[self.row_slots(column, groups)]
+        if self.encoding == 'target':
+            values[self.position] = encoded
+            return
+        if (encoded < 0).any():
+            raise ValueError(f"Column {self.name} contains previously unseen categories")
+        if self.encoding == 'label':
+            values[self.position] = encoded
+        else:
+            values[encoded, np.arange(len(encoded))] = 1.0
+
+
+class InferencePlan:
+    """
+    A fitted pipeline's transform steps flattened into lookup tables and index arrays.
+
+    `transform` turns a raw frame into the fixed-width matrix the pipeline's estimator is fed with, using
+    the fitted imputation values, frequent categories, scaling parameters, encodings and interactions
+    directly instead of running the transformers. The plan holds no estimator and no sklearn objects.
+    Features are computed in `feature_dtype`, the dtype of the pipeline's encoder, and cast to `dtype`.
+    """
+
+    def __init__(self,
+                 feature_names: List[str],
+                 dtype: np.dtype,
+                 categorical_columns: List[CategoricalColumnPlan],
+                 n_one_hot: int,
+                 numeric_positions: Dict[str, int],
+                 cgpa_fill: float,
+                 scaling: Dict[str, Tuple[float, float]],
+                 interaction_left: np.ndarray,
+                 interaction_right: np.ndarray,
+                 interaction_masks: np.ndarray,
+                 feature_dtype: np.dtype = np.float64):
+        self.feature_names = feature_names
+        self.dtype = np.dtype(dtype)
+        self.feature_dtype = np.dtype(feature_dtype)
+        self.categorical_columns = categorical_columns
+        self.n_one_hot = n_one_hot
+        self.numeric_positions = numeric_positions
+        self.cgpa_fill = cgpa_fill
+        self.scaling = scaling
+        self.interaction_left = interaction_left
+        self.interaction_right = interaction_right
+        self.interaction_masks = interaction_masks
+
+    def __setstate__(self, state):
+        # Plans exported before the pipelines encoded features in float32 computed them in float64
+        state.setdefault('feature_dtype', np.dtype(np.float64))
+        self.__dict__.update(state)
+
+    @staticmethod
+    def _groups(values: pd.Series) -> np.ndarray:
+        uniques, codes = _factorize(values)
+        group_of = np.array([STUDENT if value == 'Student' else
+                             WORKING_PROFESSIONAL if value == 'Working Professional' else NO_GROUP
+                             for value in uniques] + [NO_GROUP], dtype=np.intp)
+        return group_of[codes]
+
+    def _numeric(self, X: pd.DataFrame, column: str, groups: np.ndarray) -> np.ndarray:
+        values = X[column].to_numpy(dtype=np.float64, copy=True)
+        scale, minimum = self.scaling.get(column, (None, None))
+        if column != 'CGPA':
+            return values if scale is None else values * scale + minimum
+        missing = np.isnan(values)
+        if not np.isnan(self.cgpa_fill):
+            values[missing & (groups == STUDENT)] = self.cgpa_fill
+        values[missing & (groups == WORKING_PROFESSIONAL)] = -1
+        # Only the students' CGPA is scaled, the -1 of working professionals is kept
+        students = values > 0
+        values[students] = values[students] * scale + minimum
+        return values
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        n_encoded = len(self.feature_names) - len(self.interaction_left)
+        # Columns are built as the rows of a column-major block and transposed once at the end
+        values = np.empty((len(self.feature_names), len(X)), dtype=self.feature_dtype)
+        values[:self.n_one_hot] = 0.0
+
+        groups = self._groups(X[GROUP_COLUMN])
+        for column in self.categorical_columns:
+            column.write(values, X[column.name], groups)
+        for column, position in self.numeric_positions.items():
+            values[position] = self._numeric(X, column, groups)
+
+        cgpa = values[self.numeric_positions['CGPA']]
+        outside_group = {STUDENT_MASK: ~(cgpa > 0), WORKING_PROFESSIONAL_MASK: ~(cgpa == -1)}
+        interactions = values[n_encoded:]
+        for i in range(len(interactions)):
+            np.multiply(values[self.interaction_left[i]], values[self.interaction_right[i]], out=interactions[i])
+            if self.interaction_masks[i] != NO_MASK:
+                np.putmask(interactions[i], outside_group[self.interaction_masks[i]], -1.0)
+
+        return np.ascontiguousarray(values.T, dtype=self.dtype)
+
+
+def _find_step(pipeline, step_type):
+    steps = [step for _, step in pipeline.steps if isinstance(step, step_type)]
+    if len(steps) != 1:
+        raise ValueError(f"Expected one {step_type.__name__} step in the pipeline, found {len(steps)}")
+    return steps[0]
+
+
+def _categorical_column_plan(column: str,
+                             encoding: str,
+                             position: Optional[int],
+                             preprocessor: DataPreprocessor,
+                             encoder: EncodeCategoricalFeatures,
+                             fills: Dict[int, Any]) -> CategoricalColumnPlan:
+    """Composes the imputation, rare category collapsing, fixed categories and encoding of a column"""
+    categories = pd.Index(preprocessor.categories_[column])
+    missing_slot = len(categories)
+    # Values outside the fitted categories become missing, like `set_categories` does
+    final_slots = {label: slot for slot, label in enumerate(categories)}
+
+    if column in OUTLIER_COLUMNS:
+        # Infrequent values, including unseen ones, are collapsed into 'Other' first
+        slots = {label: final_slots.get(label, missing_slot) for label in preprocessor.frequent_categories_[column]}
+        unseen_slot = final_slots.get('Other', missing_slot)
+    else:
+        slots = final_slots
+        unseen_slot = missing_slot
+    # Fill values go through the same collapsing as raw values
+    missing_slots = np.array([slots.get(fills[group], unseen_slot) if group in fills else missing_slot
+                              for group in (STUDENT, WORKING_PROFESSIONAL, NO_GROUP)], dtype=np.intp)
+
+    # Encode one value per slot with the encoder's own lookups, the last value is missing
+    probe = pd.Series(pd.Categorical.from_codes(np.append(np.arange(len(categories)), -1), categories=categories))
+    if encoding == 'one_hot':
+        # `position` is the first output column of the one-hot block, the table holds the output columns
+        positions = _category_positions(probe, encoder.one_hot_categories_[column])
+        table = np.where(positions >= 0, positions + position, -1)
+        position = None
+    elif encoding == 'target':
+        vocabulary, values = encoder.target_tables_[column]
+        table = values[_category_positions(probe, vocabulary)]
+    else:
+        vocabulary, values = encoder.label_tables_[column]
+        table = values[_category_positions(probe, vocabulary, as_string=True)]
+
+    return CategoricalColumnPlan(column, encoding, string_keys=column in ORDINAL_COLUMNS, slots=slots,
+                                 unseen_slot=unseen_slot, missing_slots=missing_slots, table=table, position=position)
+
+
+def compile_inference_plan(model, dtype: np.dtype = np.float32) -> InferencePlan:
+    """
+    Flattens the fitted transform steps of a pipeline into an `InferencePlan`.
+
+    Parameters:
+        model: Fitted pipeline, or a fitted search wrapping one
+        dtype (np.dtype): Dtype of the matrix produced by the plan. Features are computed in the dtype of the
+            pipeline's encoder and only cast at the end, XGBoost converts its input to float32 anyway.
+
+    Returns:
+        InferencePlan: Plan producing the estimator's input matrix.
+    """
+    pipeline = getattr(model, 'best_estimator_', model)
+    preprocessor = _find_step(pipeline, DataPreprocessor)
+    scaler = _find_step(pipeline, ScaleNumericFeatures).scaler
+    encoder = _find_step(pipeline, EncodeCategoricalFeatures)
+    engineer = _find_step(pipeline, GenerateInteractionFeatures).feature_engineer
+
+    # Models saved before the transformers kept these statistics recompute them on every batch
+    if not hasattr(preprocessor, 'imputation_values_') or not hasattr(preprocessor, 'categories_'):
+        raise ValueError("The preprocessor has no fitted statistics, retrain the model to export a plan")
+    if not hasattr(encoder, 'feature_names_out_'):
+        raise ValueError("The categorical encoder predates code-based encoding, retrain the model to export a plan")
+    if not hasattr(engineer, 'interaction_names_'):
+        engineer.fit(None)
+
+    feature_names = list(encoder.feature_names_out_)
+    position_of = {name: position for position, name in enumerate(feature_names)}
+    fills = _missing_value_fills(preprocessor.imputation_values_)
+
+    categorical_columns = []
+    offset = 0
+    for column in encoder.one_hot_features:
+        categorical_columns.append(_categorical_column_plan(column, 'one_hot', offset, preprocessor, encoder,
+                                                            fills.get(column, {})))
+        offset += len(encoder.one_hot_categories_[column])
+    for encoding, prefix, columns in [('target', 'target_encoding', encoder.target_encoded_features),
+                                      ('label', 'label_encoding', encoder.label_encoded_features)]:
+        for column in columns:
+            categorical_columns.append(_categorical_column_plan(column, encoding, position_of[f'{prefix}__{column}'],
+                                                                preprocessor, encoder, fills.get(column, {})))
+
+    for column in encoder.remainder_features_:
+        if column in preprocessor.categories_:
+            raise ValueError(f"Categorical column {column} is passed through without encoding")
+    scaling = {}
+    for column, column_scaler in [('CGPA', scaler.cgpa_scaler), ('Age', scaler.age_scaler)]:
+        if column_scaler.clip:
+            raise ValueError("Clipping scalers are not supported")
+        scaling[column] = (column_scaler.scale_[0], column_scaler.min_[0])
+
+    missing = [column for column in engineer.source_columns_ if column not in position_of]
+    if missing:
+        raise ValueError(f"Interaction columns {missing} are not produced by the encoder")
+    sources = np.array([position_of[column] for column in engineer.source_columns_])
+    return InferencePlan(feature_names=feature_names + list(engineer.interaction_names_),
+                         dtype=dtype,
+                         categorical_columns=categorical_columns,
+                         n_one_hot=offset,
+                         numeric_positions={column: position_of[f'remainder__{column}']
+                                            for column in encoder.remainder_features_},
+                         cgpa_fill=float(preprocessor.imputation_values_['CGPA']),
+                         scaling=scaling,
+                         interaction_left=sources[engineer.left_index_],
+                         interaction_right=sources[engineer.right_index_],
+                         interaction_masks=np.asarray(engineer.mask_index_),
+                         feature_dtype=encoder.dtype)
+
+
+def verify_inference_plan(plan: InferencePlan, model, X: pd.DataFrame) -> None:
+    """
+    Checks bit for bit that the plan reproduces the pipeline on `X`: the features, cast to the plan's
+    dtype, and the predictions of the estimator fed with them.
+
+    Raises:
+        ValueError: If the features or predictions differ.
+    """
+    pipeline = getattr(model, 'best_estimator_', model)
+    expected = X
+    for _, step in pipeline.steps[:-1]:
+        if step not in (None, 'passthrough') and hasattr(step, 'transform'):
+            expected = step.transform(expected)
+    features = plan.transform(X)
+
+    if isinstance(expected, pd.DataFrame):
+        names = list(expected.columns)
+    else:
+        names = _find_step(pipeline, GenerateInteractionFeatures).feature_engineer.schema_.names
+    if names != plan.feature_names:
+        raise ValueError("The plan's features are not the pipeline's features")
+    expected = np.asarray(expected, dtype=plan.dtype)
+    differing = ~np.all((features == expected) | (np.isnan(features) & np.isnan(expected)), axis=0)
+    if differing.any():
+        raise ValueError(f"The plan's features differ in {', '.join(np.array(plan.feature_names)[differing])}")
+
+    estimator = pipeline.steps[-1][1]
+    if not np.array_equal(estimator.predict(features), model.predict(X)):
+        raise ValueError("The predictions from the plan's features differ from the pipeline's")
+    if hasattr(estimator, 'predict_proba') and not np.array_equal(estimator.predict_proba(features),
+                                                                  model.predict_proba(X)):
+        raise ValueError("The probabilities from the plan's features differ from the pipeline's")
+
+
+def save_inference_plan(plan: InferencePlan, plan_name: str) -> None:
+    logger.info(f"Saving inference plan {plan_name}")
+    os.makedirs(plans_dir_path, exist_ok=True)
+    save_artifact(plan, os.path.join(plans_dir_path, plan_name), ArtifactFormat.MMAP)
+
+
+def load_inference_plan(plan_name: str) -> InferencePlan:
+    logger.info(f"Loading inference plan {plan_name}")
+    return load_artifact(os.path.join(plans_dir_path, plan_name))
+
+
+def export_inference_plan(model_file: str, file_name: str = 'test.csv', dtype: np.dtype = np.float32) -> InferencePlan:
+    """
+    Compiles the inference plan of a saved model, verifies it on held-out data and saves it next to the models.
+
+    Parameters:
+        model_file (str): File name of the saved model, also used for the plan
+        file_name (str): File in the raw data directory the plan is verified on
+        dtype (np.dtype): Dtype of the matrix produced by the plan
+
+    Returns:
+        InferencePlan: The exported plan.
+    """
+    model = load_model(model_file)
+    plan = compile_inference_plan(model, dtype)
+    verify_inference_plan(plan, model, load_data(file_name, dtype=RAW_DTYPES, cache=True))
+    logger.info(f"Inference plan matches the pipeline on {file_name}")
+    save_inference_plan(plan, model_file)
+    return plan
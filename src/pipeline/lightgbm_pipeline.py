@@ -1,19 +1,19 @@
+from imblearn.pipeline import Pipeline
 from lightgbm import LGBMClassifier
-from sklearn.pipeline import Pipeline
 
 from src.pipeline.base_pipeline import get_base_pipeline_steps
-from src.validation.grid_search import build_grid_search_cv
+from src.pipeline.early_stopping import build_early_stopping_pipeline
+from src.validation.grid_search import SearchStrategy, build_grid_search_cv
 
 
-def build_lightgbm_pipeline():
+def build_lightgbm_pipeline(search: SearchStrategy = SearchStrategy.GRID, budget: int = None,
+                            early_stopping_rounds: int = None):
     lgbm = LGBMClassifier()
 
     base_pipeline_steps = get_base_pipeline_steps()
     # Add model to pipeline
     base_pipeline_steps.append(('lgbm', lgbm))
 
-    pipeline = Pipeline(base_pipeline_steps)
-
     lgbm_param_grid = {
         'lgbm__n_estimators': [100, 200, 300],
         'lgbm__num_leaves': [15, 31, 63],
@@ -22,4 +22,10 @@ def build_lightgbm_pipeline():
         'lgbm__bagging_fraction': [0.7, 0.8, 1.0]
     }
 
-    return build_grid_search_cv(pipeline, lgbm_param_grid)
+    if early_stopping_rounds is None:
+        pipeline = Pipeline(base_pipeline_steps)
+    else:
+        pipeline, lgbm_param_grid = build_early_stopping_pipeline(base_pipeline_steps, lgbm_param_grid,
+                                                                  'lgbm__n_estimators', early_stopping_rounds, search)
+
+    return build_grid_search_cv(pipeline, lgbm_param_grid, search=search, budget=budget, resource='lgbm__n_estimators')
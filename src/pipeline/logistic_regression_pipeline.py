@@ -1,11 +1,11 @@
-from sklearn.pipeline import Pipeline
+from imblearn.pipeline import Pipeline
 from sklearn.linear_model import LogisticRegression
 
 from src.pipeline.base_pipeline import get_base_pipeline_steps
-from src.validation.grid_search import build_grid_search_cv
+from src.validation.grid_search import SearchStrategy, build_grid_search_cv
 
 
-def build_logistic_regression_pipeline():
+def build_logistic_regression_pipeline(search: SearchStrategy = SearchStrategy.GRID, budget: int = None):
     logreg = LogisticRegression(random_state=42)
 
     base_pipeline_steps = get_base_pipeline_steps()
@@ -22,4 +22,4 @@ def build_logistic_regression_pipeline():
         'logreg__l1_ratio': [0.1, 0.5, 0.9],  # ElasticNet mixing ratio (only if penalty='elasticnet')
     }
 
-    return build_grid_search_cv(pipeline, logreg_param_grid)
+    return build_grid_search_cv(pipeline, logreg_param_grid, search=search, budget=budget)
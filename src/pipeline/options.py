@@ -0,0 +1,23 @@
+from enum import Enum
+
+
+# Options of the command line. This module imports no library, so main.py parses its arguments without loading
+# scikit-learn or any boosting library. The modules using the options re-export them.
+
+
+class SearchStrategy(Enum):
+    GRID = 'grid'
+    HALVING = 'halving'
+    RANDOM = 'random'
+
+
+class ImbalanceStrategy(Enum):
+    SMOTE = 'smote'
+    APPROXIMATE_SMOTE = 'approximate_smote'
+    UNDERSAMPLE = 'undersample'
+    CLASS_WEIGHT = 'class_weight'
+
+
+class ThresholdObjective(Enum):
+    F1 = 'f1'
+    RECALL = 'recall'
@@ -1,19 +1,20 @@
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.pipeline import Pipeline
+from enum import Enum
+
+from imblearn.pipeline import Pipeline
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
 
 from src.pipeline.base_pipeline import get_base_pipeline_steps
-from src.validation.grid_search import build_grid_search_cv
+from src.validation.grid_search import SearchStrategy, build_grid_search_cv
 
 
-def build_random_forest_pipeline():
-    rf = RandomForestClassifier(random_state=42)
+class ForestBackend(Enum):
+    SKLEARN = 'sklearn'
+    LIGHTGBM = 'lightgbm'
+    HISTOGRAM = 'histogram'
 
-    base_pipeline_steps = get_base_pipeline_steps()
-    # Add model to pipeline
-    base_pipeline_steps.append(('rf', rf))
-
-    pipeline = Pipeline(base_pipeline_steps)
 
+def _sklearn_forest():
+    rf = RandomForestClassifier(random_state=42)
     rf_param_grid = {
         'rf__n_estimators': [50, 100, 200],  # Number of trees
         'rf__max_depth': [None, 10, 20],  # Maximum depth of trees
@@ -21,5 +22,52 @@ def build_random_forest_pipeline():
         'rf__min_samples_leaf': [1, 2, 4],  # Minimum samples in a leaf
         'rf__bootstrap': [True, False]  # Bootstrap samples
     }
+    return rf, rf_param_grid, 'rf__n_estimators'
+
+
+def _lightgbm_forest():
+    # Imported here, the other backends do not load LightGBM
+    from lightgbm import LGBMClassifier
+
+    # Random forest mode: bagged trees averaged instead of boosted, grown on features binned into 63 buckets
+    rf = LGBMClassifier(boosting_type='rf', bagging_freq=1, bagging_fraction=0.632, max_bin=63, random_state=42,
+                        verbose=-1)
+    rf_param_grid = {
+        'rf__n_estimators': [50, 100, 200],  # Number of trees
+        'rf__num_leaves': [63, 255, 1023],  # Maximum leaves of trees, bounds their size
+        'rf__min_child_samples': [1, 5, 20],  # Minimum samples in a leaf
+        'rf__feature_fraction': [0.3, 0.5, 0.8],  # Features considered by each tree
+    }
+    return rf, rf_param_grid, 'rf__n_estimators'
+
+
+def _histogram_forest():
+    # Gradient boosted trees on binned features, a few shallow trees replace many deep ones
+    rf = HistGradientBoostingClassifier(max_bins=63, early_stopping=False, random_state=42)
+    rf_param_grid = {
+        'rf__max_iter': [50, 100, 200],  # Number of trees
+        'rf__max_leaf_nodes': [15, 31, 63],  # Maximum leaves of trees
+        'rf__min_samples_leaf': [10, 20, 50],  # Minimum samples in a leaf
+        'rf__learning_rate': [0.05, 0.1, 0.2],
+    }
+    return rf, rf_param_grid, 'rf__max_iter'
+
+
+FOREST_BACKENDS = {
+    ForestBackend.SKLEARN: _sklearn_forest,
+    ForestBackend.LIGHTGBM: _lightgbm_forest,
+    ForestBackend.HISTOGRAM: _histogram_forest,
+}
+
+
+def build_random_forest_pipeline(search: SearchStrategy = SearchStrategy.GRID, budget: int = None,
+                                 backend: ForestBackend = ForestBackend.SKLEARN):
+    rf, rf_param_grid, resource = FOREST_BACKENDS[ForestBackend(backend)]()
+
+    base_pipeline_steps = get_base_pipeline_steps()
+    # Add model to pipeline
+    base_pipeline_steps.append(('rf', rf))
+
+    pipeline = Pipeline(base_pipeline_steps)
 
-    return build_grid_search_cv(pipeline, rf_param_grid)
+    return build_grid_search_cv(pipeline, rf_param_grid, search=search, budget=budget, resource=resource)
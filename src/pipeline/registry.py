@@ -0,0 +1,52 @@
+import importlib
+from functools import partial
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class ModelFamily(NamedTuple):
+    """
+    Model family trained from the command line, named by the module and function building its pipeline.
+
+    The module is only imported when the family is built, so a command loads the libraries of the families it
+    trains and no others.
+    """
+    module: str
+    builder: str
+    # Keyword arguments bound to the builder, for families sharing a builder
+    options: Optional[Dict[str, Any]] = None
+    # Boosted models, their builders can stop adding rounds on a validation split
+    early_stopping: bool = False
+    # Fit keyword continuing the boosting of a fitted model, and the parameter of the number of rounds it adds
+    warm_start: Optional[str] = None
+    rounds_param: Optional[str] = None
+
+
+MODEL_FAMILIES = {
+    'xgb': ModelFamily('src.pipeline.xgboost_pipeline', 'build_xgb_pipeline', early_stopping=True,
+                       warm_start='xgb_model', rounds_param='n_estimators'),
+    'catboost': ModelFamily('src.pipeline.catboost_pipeline', 'build_catboost_pipeline', early_stopping=True,
+                            warm_start='init_model', rounds_param='iterations'),
+    'rf': ModelFamily('src.pipeline.random_forest_pipeline', 'build_random_forest_pipeline'),
+    # Faster forests on binned features, saved and ranked as families of their own
+    'rf_lgbm': ModelFamily('src.pipeline.random_forest_pipeline', 'build_random_forest_pipeline',
+                           options={'backend': 'lightgbm'}),
+    'rf_hist': ModelFamily('src.pipeline.random_forest_pipeline', 'build_random_forest_pipeline',
+                           options={'backend': 'histogram'}),
+    'lgbm': ModelFamily('src.pipeline.lightgbm_pipeline', 'build_lightgbm_pipeline', early_stopping=True,
+                        warm_start='init_model', rounds_param='n_estimators'),
+    'logreg': ModelFamily('src.pipeline.logistic_regression_pipeline', 'build_logistic_regression_pipeline'),
+}
+
+
+def get_model_family(model: str) -> ModelFamily:
+    family = MODEL_FAMILIES.get(model.lower())
+    if family is None:
+        raise ValueError(f"Model {model} not supported")
+    return family
+
+
+def get_model_builder(model: str) -> Callable:
+    """Imports the module of a model family and returns the function building its pipeline"""
+    family = get_model_family(model)
+    builder = getattr(importlib.import_module(family.module), family.builder)
+    return partial(builder, **family.options) if family.options else builder
@@ -0,0 +1,75 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+import pandas as pd
+
+from src.data.data_preprocessing import RAW_DTYPES
+from src.validation.evaluation import predict_with_threshold
+from utils.data import iter_data, save_data
+from utils.helpers import load_model
+from utils.logger import get_logger
+
+logger = get_logger("Scoring")
+
+# Model loaded once by each worker of the process pool
+_worker_model = None
+
+
+def _init_worker(model_file: str) -> None:
+    global _worker_model
+    _worker_model = load_model(model_file)
+
+
+def _score_chunk(chunk: pd.DataFrame, model=None) -> pd.DataFrame:
+    model = _worker_model if model is None else model
+    return pd.DataFrame({'id': chunk['id'].to_numpy(), 'Depression': predict_with_threshold(model, chunk)})
+
+
+def _score_chunks_in_parallel(model_file: str, chunks: Iterable[pd.DataFrame], n_jobs: int) -> Iterator[pd.DataFrame]:
+    """
+    Scores chunks on a process pool and yields the predictions in input order.
+
+    At most `2 * n_jobs` chunks are in flight, so memory stays bounded however large the input is.
+    """
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(model_file,)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_score_chunk, chunk))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def score_in_chunks(model_file: str,
+                    file_name: str = 'test.csv',
+                    save_path: str = 'submission/submission.csv',
+                    chunksize: int = 100_000,
+                    n_jobs: Optional[int] = None) -> int:
+    """
+    Streams a CSV file through a saved model and appends the predictions to `save_path`.
+
+    Parameters:
+        model_file (str): File name of the saved model
+        file_name (str): File in the raw data directory to score
+        save_path (str): Path of the predictions relative to the data directory
+        chunksize (int): Number of rows read and scored at a time
+        n_jobs (Optional[int]): Number of worker processes. None scores the chunks in this process.
+
+    Returns:
+        int: Number of rows scored.
+    """
+    chunks = iter_data(file_name, chunksize, dtype=RAW_DTYPES)
+    if n_jobs is None:
+        model = load_model(model_file)
+        predictions = (_score_chunk(chunk, model) for chunk in chunks)
+    else:
+        predictions = _score_chunks_in_parallel(model_file, chunks, n_jobs)
+
+    n_rows = 0
+    for i, chunk_predictions in enumerate(predictions):
+        save_data(chunk_predictions, save_path, append=i > 0)
+        n_rows += len(chunk_predictions)
+        logger.info(f"Scored {n_rows} rows")
+    return n_rows
@@ -0,0 +1,294 @@
+import asyncio
+import copy
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data.data_preprocessing import ORDINAL_COLUMNS
+from src.pipeline.inference_plan import InferencePlan, load_inference_plan
+from src.transformers.preprocessors import DataPreprocessor
+from src.validation.evaluation import DECISION_THRESHOLD, apply_threshold
+from utils.helpers import load_model
+from utils.logger import get_logger
+
+logger = get_logger("Serving")
+
+# Raw columns read as floats from the CSV, JSON clients may send them as integers or null
+FLOAT_COLUMNS = ['Age', 'CGPA'] + ORDINAL_COLUMNS
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+
+def records_to_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Builds a raw input frame from JSON records, with the numeric columns as floats like in the CSV files"""
+    frame = pd.DataFrame.from_records(records)
+    for column in FLOAT_COLUMNS:
+        if column in frame.columns and frame[column].dtype != np.float64:
+            frame[column] = pd.to_numeric(frame[column]).astype(float)
+    return frame
+
+
+class ScoringModel:
+    """
+    A saved model prepared for repeated scoring of small batches.
+
+    The transform steps are resolved once, samplers are skipped like in imblearn's Pipeline.
+    The preprocessor works in place because every batch is a frame built for this call only.
+    With an inference plan, the plan replaces the transform steps.
+    """
+
+    def __init__(self, model, plan: Optional[InferencePlan] = None):
+        pipeline = getattr(model, 'best_estimator_', model)
+        self.steps = [step for _, step in pipeline.steps[:-1]
+                      if step not in (None, 'passthrough') and hasattr(step, 'transform')]
+        self.estimator = pipeline.steps[-1][1]
+        self.threshold = getattr(model, DECISION_THRESHOLD, None)
+        # Checked by module, serving a model of another family does not load XGBoost
+        self.is_xgboost = type(self.estimator).__module__.startswith('xgboost')
+        self.plan = plan
+        # Loaded models are shared through the model cache, only this copy of the preprocessor works in place
+        self.steps = [copy.copy(step).set_params(copy=False) if isinstance(step, DataPreprocessor) else step
+                      for step in self.steps]
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        if self.plan is not None:
+            return self.estimator.predict_proba(self.plan.transform(X))
+        for step in self.steps:
+            X = step.transform(X)
+        # XGBoost inspects the dtype of every column of a DataFrame on each call, which dominates small batches
+        if self.is_xgboost and isinstance(X, pd.DataFrame):
+            X = X.to_numpy()
+        return self.estimator.predict_proba(X)
+
+    def score_records(self, records: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the predicted class and positive class probability of every record"""
+        probabilities = self.predict_proba(records_to_frame(records))
+        return apply_threshold(probabilities, self.estimator.classes_, self.threshold), probabilities[:, 1]
+
+
+class LatencyTracker:
+    """Keeps the latencies of the most recent requests"""
+
+    def __init__(self, window: int = 10_000):
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        if not self.latencies:
+            return {'count': 0}
+        p50, p99 = np.percentile(np.fromiter(self.latencies, dtype=float), [50, 99]) * 1000
+        return {'count': len(self.latencies), 'p50_ms': round(p50, 3), 'p99_ms': round(p99, 3)}
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for up to `max_delay` seconds and scores them as one batch.
+
+    `n_workers` batches are scored at a time on a thread pool, so the next batch is collected while
+    the previous one is scored. A failing batch is retried request by request, so an invalid record
+    only fails its own request.
+    """
+
+    def __init__(self, model: ScoringModel, max_batch_size: int = 64, max_delay: float = 0.002, n_workers: int = 2):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.n_workers = n_workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.n_workers, thread_name_prefix='scoring')
+        self._tasks = [asyncio.create_task(self._batch_loop()) for _ in range(self.n_workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    async def predict(self, records: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((records, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[List[Dict[str, Any]], asyncio.Future]]:
+        """Waits for a first request, then gathers more until the batch is full or `max_delay` has passed"""
+        batch = [await self._queue.get()]
+        n_records = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_delay
+        while n_records < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            n_records += len(request[0])
+        return batch
+
+    async def _score(self, records: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.model.score_records, records)
+
+    async def _batch_loop(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                predictions, probabilities = await self._score(
+                    [record for records, _ in batch for record in records])
+            except Exception as e:
+                if len(batch) == 1:
+                    _resolve(batch[0][1], exception=e)
+                    continue
+                # Score the requests one by one so only the invalid ones fail
+                for records, future in batch:
+                    try:
+                        _resolve(future, result=await self._score(records))
+                    except Exception as request_error:
+                        _resolve(future, exception=request_error)
+                continue
+
+            start = 0
+            for records, future in batch:
+                end = start + len(records)
+                _resolve(future, result=(predictions[start:end], probabilities[start:end]))
+                start = end
+
+
+def _resolve(future: asyncio.Future, result: Any = None, exception: Optional[Exception] = None) -> None:
+    # The client may have disconnected and its request been cancelled meanwhile
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+class ScoringServer:
+    """
+    Minimal HTTP/1.1 JSON front end over a `MicroBatcher`, on a TCP port or a Unix socket.
+
+    Endpoints:
+        POST /predict: a record, a list of records or {"records": [...]}, answered with
+            {"predictions": [...], "probabilities": [...]}
+        GET /stats: p50/p99 latency in milliseconds over the most recent requests
+        GET /health: liveness check
+    """
+
+    def __init__(self, batcher: MicroBatcher, latency: Optional[LatencyTracker] = None):
+        self.batcher = batcher
+        self.latency = latency or LatencyTracker()
+
+    async def _handle_request(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/stats':
+            return 200, self.latency.summary()
+        if path != '/predict':
+            return 404, {'error': f'Unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST to predict'}
+
+        try:
+            payload = json.loads(body)
+            records = payload['records'] if isinstance(payload, dict) and 'records' in payload else payload
+            records = [records] if isinstance(records, dict) else records
+            if not records or not all(isinstance(record, dict) for record in records):
+                raise ValueError("Expected a record or a non-empty list of records")
+            predictions, probabilities = await self.batcher.predict(records)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            logger.error(f"Scoring failed: {e}")
+            return 500, {'error': 'Scoring failed'}
+        return 200, {'predictions': predictions.tolist(), 'probabilities': probabilities.tolist()}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, response = await self._handle_request(method, path, body)
+                content = json.dumps(response).encode()
+                writer.write(f'HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n'
+                             f'Content-Type: application/json\r\n'
+                             f'Content-Length: {len(content)}\r\n\r\n'.encode() + content)
+                await writer.drain()
+                if path == '/predict':
+                    self.latency.record(time.perf_counter() - start)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8000, unix_socket: Optional[str] = None):
+        await self.batcher.start()
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+        logger.info(f"Serving on {unix_socket or f'http://{host}:{port}'}")
+        return server
+
+
+async def _serve_forever(server: ScoringServer, host: str, port: int, unix_socket: Optional[str]) -> None:
+    listener = await server.start(host, port, unix_socket)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.batcher.stop()
+        logger.info(f"Request latency: {server.latency.summary()}")
+
+
+def serve(model_file: str,
+          host: str = '127.0.0.1',
+          port: int = 8000,
+          unix_socket: Optional[str] = None,
+          max_batch_size: int = 64,
+          max_delay: float = 0.002,
+          n_workers: int = 2,
+          use_plan: bool = False) -> None:
+    """
+    Loads a saved model once and serves its predictions until interrupted.
+
+    Parameters:
+        model_file (str): File name of the saved model
+        host (str): Address to listen on
+        port (int): TCP port to listen on
+        unix_socket (Optional[str]): Path of a Unix socket to listen on instead of the TCP port
+        max_batch_size (int): Maximum number of records scored together
+        max_delay (float): Seconds a request may wait for other requests to batch with
+        n_workers (int): Number of batches scored concurrently
+        use_plan (bool): Whether to transform the records with the model's exported inference plan
+    """
+    model = ScoringModel(load_model(model_file), load_inference_plan(model_file) if use_plan else None)
+    server = ScoringServer(MicroBatcher(model, max_batch_size, max_delay, n_workers))
+    try:
+        asyncio.run(_serve_forever(server, host, port, unix_socket))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,167 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.linear_model import LogisticRegression
+
+from utils.data import _read_manifest, _write_manifest
+from utils.helpers import get_model_file, load_model, models_dir_path
+from utils.logger import get_logger
+
+logger = get_logger("Stacking")
+
+# Out-of-fold probabilities of the trained models, next to the models themselves
+OOF_DIR = 'oof'
+
+# Probabilities are clipped before taking their logit, boosted models output exact 0s and 1s
+EPSILON = 1e-6
+
+
+def split_fingerprint(X_train: pd.DataFrame, y_train: pd.Series) -> str:
+    """Identifies a training split by its rows and labels, out-of-fold predictions are only stacked on the same one"""
+    sha256 = hashlib.sha256(np.ascontiguousarray(X_train.index.to_numpy(dtype=np.int64)).tobytes())
+    sha256.update(np.ascontiguousarray(y_train.to_numpy(dtype=np.int8)).tobytes())
+    return sha256.hexdigest()[:16]
+
+
+class OOFStore:
+    """
+    Out-of-fold probabilities of the positive class of every trained model, keyed by model file.
+
+    Each model's probabilities are a .npy file loaded memory-mapped, the labels of each training split are stored
+    once. A manifest records the split every model was cross-validated on, so models trained at different times
+    are stacked only when their predictions are aligned row by row.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(models_dir_path, OOF_DIR)
+
+    def _manifest(self) -> Dict[str, Any]:
+        return _read_manifest(self.path) or {'models': {}, 'splits': {}}
+
+    def save(self, model_file: str, y_proba: np.ndarray, y_train: pd.Series, fingerprint: str, n_folds: int) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        key = os.path.splitext(model_file)[0]
+        np.save(os.path.join(self.path, f'{key}.npy'), np.asarray(y_proba, dtype=np.float32))
+        manifest = self._manifest()
+        if fingerprint not in manifest['splits']:
+            np.save(os.path.join(self.path, f'labels_{fingerprint}.npy'), y_train.to_numpy(dtype=np.int8))
+            manifest['splits'][fingerprint] = {'labels': f'labels_{fingerprint}.npy', 'rows': len(y_train)}
+        manifest['models'][key] = {'file': f'{key}.npy', 'split': fingerprint, 'folds': n_folds}
+        _write_manifest(self.path, manifest)
+        logger.info(f"Saved the out-of-fold predictions of {model_file}")
+
+    def load(self, model_file: str) -> Tuple[np.memmap, str]:
+        """Probabilities of a model and the fingerprint of its split, raises a KeyError for unknown models"""
+        key = os.path.splitext(model_file)[0]
+        entry = self._manifest()['models'].get(key)
+        if entry is None:
+            raise KeyError(f"No out-of-fold predictions of {model_file}, train it with --oof")
+        return np.load(os.path.join(self.path, entry['file']), mmap_mode='r'), entry['split']
+
+    def labels(self, fingerprint: str) -> np.memmap:
+        split = self._manifest()['splits'][fingerprint]
+        return np.load(os.path.join(self.path, split['labels']), mmap_mode='r')
+
+
+def _logit(y_proba: np.ndarray) -> np.ndarray:
+    y_proba = np.clip(y_proba, EPSILON, 1 - EPSILON)
+    return np.log(y_proba / (1 - y_proba))
+
+
+class StackingEnsemble(BaseEstimator, ClassifierMixin):
+    """
+    Logistic regression over the logits of saved models' probabilities.
+
+    The base models are referenced by file and loaded through the model cache, the ensemble's artifact holds
+    the meta-learner only. They score a batch concurrently on a thread pool, the boosting libraries release
+    the GIL while predicting.
+
+    Parameters:
+        members (List[str]): Model files of the base models, e.g. ['xgb_v4.0.joblib', 'lgbm_v3.0.joblib']
+        meta_learner: Classifier fitted on the base models' logits, a logistic regression by default
+        n_jobs (Optional[int]): Base models scoring at the same time, all of them by default
+    """
+
+    def __init__(self, members: List[str], meta_learner=None, n_jobs: Optional[int] = None):
+        self.members = members
+        self.meta_learner = meta_learner
+        self.n_jobs = n_jobs
+
+    def fit(self, y_proba: np.ndarray, y):
+        """
+        Fits the meta-learner on out-of-fold probabilities of the positive class of the members, one column per
+        member, not on raw features: the members are already fitted.
+        """
+        self.meta_learner_ = LogisticRegression() if self.meta_learner is None else self.meta_learner
+        self.meta_learner_.fit(_logit(y_proba), y)
+        self.classes_ = self.meta_learner_.classes_
+        return self
+
+    def __getstate__(self):
+        # The members are saved on their own, the ensemble's artifact only references them
+        state = self.__dict__.copy()
+        state.pop('_models', None)
+        return state
+
+    def _loaded_members(self) -> list:
+        if getattr(self, '_models', None) is None:
+            self._models = [load_model(member) for member in self.members]
+        return self._models
+
+    def base_proba(self, X: pd.DataFrame) -> np.ndarray:
+        """Probability of the positive class of every member, one column per member"""
+        models = self._loaded_members()
+        with ThreadPoolExecutor(max_workers=self.n_jobs or len(models)) as executor:
+            probabilities = list(executor.map(lambda model: model.predict_proba(X)[:, 1], models))
+        return np.column_stack(probabilities)
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        return self.meta_learner_.predict_proba(_logit(self.base_proba(X)))
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _member_file(member: str) -> str:
+    """Model file of a member given as a model name, e.g. xgb for its latest version, or with a version, xgb:4.0"""
+    name, _, version = member.partition(':')
+    model_file = get_model_file(name, float(version) if version else None)
+    if model_file is None:
+        raise ValueError(f"No saved model {member}")
+    return model_file
+
+
+def build_stacking_ensemble(members: List[str], store: OOFStore = None, meta_learner=None) -> StackingEnsemble:
+    """
+    Fits a stacking ensemble on the stored out-of-fold predictions of saved models.
+
+    No base model is trained again: adding a member only needs its out-of-fold predictions, collected when
+    it was trained on the same split as the others.
+
+    Parameters:
+        members (List[str]): Base models, e.g. ['xgb', 'lgbm:3.0']
+        store (OOFStore): Store of the out-of-fold predictions
+        meta_learner: Classifier fitted on the base models' logits, a logistic regression by default
+
+    Returns:
+        StackingEnsemble: The fitted ensemble
+    """
+    store = store or OOFStore()
+    model_files = [_member_file(member) for member in members]
+    predictions = [store.load(model_file) for model_file in model_files]
+    fingerprints = {fingerprint for _, fingerprint in predictions}
+    if len(fingerprints) > 1:
+        raise ValueError(f"{', '.join(model_files)} were not cross-validated on the same training split")
+
+    y_proba = np.column_stack([y_proba for y_proba, _ in predictions])
+    ensemble = StackingEnsemble(model_files, meta_learner).fit(y_proba, store.labels(fingerprints.pop()))
+    logger.info(f"Stacked {', '.join(model_files)}")
+    if hasattr(ensemble.meta_learner_, 'coef_'):
+        logger.info(f"Weights of their logits: {np.round(ensemble.meta_learner_.coef_.ravel(), 3).tolist()}")
+    return ensemble
+
@@ -1,78 +1,372 @@
+import copy
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
 import pandas as pd
 
-from sklearn.model_selection import train_test_split
+from sklearn.base import clone
+from sklearn.model_selection import cross_val_predict, train_test_split
 
-from src.pipeline.catboost_pipeline import build_catboost_pipeline
-from src.pipeline.lightgbm_pipeline import build_lightgbm_pipeline
-from src.pipeline.logistic_regression_pipeline import build_logistic_regression_pipeline
-from src.pipeline.random_forest_pipeline import build_random_forest_pipeline
-from src.pipeline.xgboost_pipeline import build_xgb_pipeline
-from src.validation.evaluation import evaluate_classification_model, log_metrics
+from src.data.data_preprocessing import RAW_DTYPES
+from src.pipeline.early_stopping import PATIENCE_PARAMS
+from src.pipeline.imbalance import ImbalanceStrategy, apply_imbalance_strategy
+from src.pipeline.options import ThresholdObjective
+from src.pipeline.registry import MODEL_FAMILIES, ModelFamily, get_model_builder, get_model_family
+from src.pipeline.scoring import score_in_chunks
+from src.pipeline.stacking import OOFStore, build_stacking_ensemble, split_fingerprint
+from src.validation.evaluation import (DECISION_THRESHOLD, apply_threshold, bootstrap_confidence_intervals,
+                                       evaluate_classification_model, log_metrics, optimize_threshold,
+                                       predict_with_threshold)
+from src.validation.grid_search import SearchStrategy, cached_pipeline_steps, fit_cached_pipeline_steps
+from utils.artifacts import ArtifactFormat
 from utils.data import load_data, save_data
-from utils.helpers import save_model, load_latest_model, get_latest_model_file, load_model
+from utils.helpers import get_latest_model_file, get_model_file, get_model_info, load_model, save_model
 from utils.logger import get_logger
+from utils.resources import ResourcePolicy
 
 logger = get_logger("Train Model")
 
+# Leaderboard of the last models trained together, relative to the data directory
+LEADERBOARD_FILE = 'leaderboard.csv'
+
+# Name the stacking ensembles are saved under
+STACK_MODEL = 'stack'
 
-def train_and_evaluate(model: str, version: float = None):
-    if version is None:
-        latest_model_file = get_latest_model_file(model)
-        version = 1.0 if latest_model_file is None else float(
-            latest_model_file.split("_")[-1].split(".")[0].replace('v', ''))
 
-    logger.info(f"Training {model} model with version: {version}")
+def build_model_pipeline(model: str, search: SearchStrategy = SearchStrategy.GRID, budget: int = None,
+                         early_stopping_rounds: int = None):
+    if model.lower() not in MODEL_FAMILIES:
+        logger.error(f"Model {model} not supported")
+        raise ValueError(f"Model {model} not supported")
+    builder = get_model_builder(model)
+    if early_stopping_rounds is None or not MODEL_FAMILIES[model.lower()].early_stopping:
+        return builder(search, budget)
+    return builder(search, budget, early_stopping_rounds)
 
-    # Load data
-    data = load_data()
+
+def load_train_test_split():
+    """Loads the training data and splits it into train and test sets"""
+    data = load_data(dtype=RAW_DTYPES, cache=True)
     target = 'Depression'
     X, y = data.drop(columns=[target]), data[target]
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+
+def _next_version(model: str) -> float:
+    # A new model gets the version after the latest registered one
+    latest = get_model_info(model)
+    return 1.0 if latest is None else float(int(latest['version']) + 1)
+
+
+def _build_search(model: str, search: SearchStrategy, budget: int, early_stopping_rounds: int,
+                  imbalance: ImbalanceStrategy, y_train: pd.Series):
+    pipeline = build_model_pipeline(model, search, budget, early_stopping_rounds)
+    apply_imbalance_strategy(pipeline, imbalance, y_train)
+    return pipeline
+
+
+def _out_of_fold_proba(search, X_train: pd.DataFrame, y_train: pd.Series) -> np.ndarray:
+    # Probabilities of the best parameters on the search's folds, the test split stays unseen
+    y_proba = cross_val_predict(search.best_estimator_, X_train, y_train, cv=search.cv, method='predict_proba')
+    return y_proba[:, 1]
+
+
+def _fit_and_evaluate(model: str, split, search: SearchStrategy, budget: int = None,
+                      early_stopping_rounds: int = None, imbalance: ImbalanceStrategy = ImbalanceStrategy.SMOTE,
+                      policy: ResourcePolicy = None, cache_dir: str = None,
+                      threshold_objective: ThresholdObjective = None, target_recall: float = 0.9,
+                      collect_oof: bool = False):
+    """
+    Fits a model family's search and evaluates the best model on the test split.
+
+    Returns the fitted search, its metrics, the fit time, and the out-of-fold probabilities of the positive
+    class on the training split when they were collected, for the threshold or the stacking ensembles.
+    """
+    X_train, X_test, y_train, y_test = split
+    policy = policy or ResourcePolicy()
+    pipeline = _build_search(model, search, budget, early_stopping_rounds, imbalance, y_train)
+    policy.configure(pipeline)
+
+    # Train model, fitting the preprocessing steps once per fold
+    start = time.perf_counter()
+    with cached_pipeline_steps(pipeline, cache_dir), policy.limits():
+        pipeline.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    oof_proba = None
+    if collect_oof or threshold_objective is not None:
+        with policy.limits():
+            oof_proba = _out_of_fold_proba(pipeline, X_train, y_train)
+    # Only the cross-validation fits share the cores, the saved model predicts with all of its threads
+    policy.restore(pipeline)
+
+    # The threshold is stored with the model, predictions made from the saved model use it
+    threshold = None
+    if threshold_objective is not None:
+        threshold = optimize_threshold(y_train, oof_proba, threshold_objective, target_recall)
+        logger.info(f"Decision threshold {threshold:.4f} optimizes {threshold_objective.value} on out-of-fold "
+                    f"predictions")
+        setattr(pipeline, DECISION_THRESHOLD, threshold)
+
+    return pipeline, _evaluate(pipeline, X_test, y_test), fit_time, oof_proba if collect_oof else None
+
+
+def _evaluate(pipeline, X_test: pd.DataFrame, y_test: pd.Series) -> Dict[str, float]:
+    # Labels are predicted with the decision threshold stored with the model, if any
+    threshold = getattr(pipeline, DECISION_THRESHOLD, None)
+    y_proba = pipeline.predict_proba(X_test)
+    y_pred = apply_threshold(y_proba, pipeline.classes_, threshold)
+    metrics = evaluate_classification_model(y_test, y_pred, y_proba[:, 1])
+    log_metrics(metrics, logger, bootstrap_confidence_intervals(y_test, y_proba[:, 1], threshold))
+    return metrics
+
+
+def _save(pipeline, model: str, version: float, metrics, split, artifact_format: ArtifactFormat,
+          oof_proba: np.ndarray = None) -> None:
+    X_train, y_train = split[0], split[2]
+    model_file = f'{model}_v{version}.joblib'
+    save_model(pipeline, model_file, metrics=metrics,
+               features={column: str(dtype) for column, dtype in X_train.dtypes.items()},
+               artifact_format=artifact_format, threshold=getattr(pipeline, DECISION_THRESHOLD, None))
+    if oof_proba is not None:
+        OOFStore().save(model_file, oof_proba, y_train, split_fingerprint(X_train, y_train), pipeline.cv.get_n_splits())
+
+
+def train_and_evaluate(model: str,
+                       version: float = None,
+                       search: SearchStrategy = SearchStrategy.GRID,
+                       budget: int = None,
+                       artifact_format: ArtifactFormat = ArtifactFormat.COMPRESSED,
+                       policy: ResourcePolicy = None,
+                       early_stopping_rounds: int = None,
+                       imbalance: ImbalanceStrategy = ImbalanceStrategy.SMOTE,
+                       threshold_objective: ThresholdObjective = None,
+                       target_recall: float = 0.9,
+                       collect_oof: bool = False):
+    version = _next_version(model) if version is None else version
+    policy = policy or ResourcePolicy()
+    logger.info(f"Training {model} model with version: {version} using {search.value} search, "
+                f"{imbalance.value} imbalance strategy, {policy}")
+
+    split = load_train_test_split()
+    pipeline, metrics, _, oof_proba = _fit_and_evaluate(model, split, search, budget, early_stopping_rounds, imbalance,
+                                                        policy, threshold_objective=threshold_objective,
+                                                        target_recall=target_recall, collect_oof=collect_oof)
+    _save(pipeline, model, version, metrics, split, artifact_format, oof_proba)
+
 
-    from sklearn.utils.class_weight import compute_class_weight
-    import numpy as np
-
-    class_weights = compute_class_weight('balanced', classes=np.unique(y), y=y)
-    class_weight_dict = {i: weight for i, weight in enumerate(class_weights)}
-    print(class_weight_dict)
-
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # Create pipeline
-    if model.lower() == 'xgb':
-        pipeline = build_xgb_pipeline()
-    elif model.lower() == 'catboost':
-        pipeline = build_catboost_pipeline()
-    elif model.lower() == 'rf':
-        pipeline = build_random_forest_pipeline()
-    elif model.lower() == 'lgbm':
-        pipeline = build_lightgbm_pipeline()
-    elif model.lower() == 'logreg':
-        pipeline = build_logistic_regression_pipeline()
+def train_models(models: List[str],
+                 version: float = None,
+                 search: SearchStrategy = SearchStrategy.GRID,
+                 budget: int = None,
+                 artifact_format: ArtifactFormat = ArtifactFormat.COMPRESSED,
+                 policy: ResourcePolicy = None,
+                 early_stopping_rounds: int = None,
+                 imbalance: ImbalanceStrategy = ImbalanceStrategy.SMOTE,
+                 threshold_objective: ThresholdObjective = None,
+                 target_recall: float = 0.9,
+                 collect_oof: bool = False) -> pd.DataFrame:
+    """
+    Trains several model families on a process pool and ranks them on the test split.
+
+    The data is loaded and split once. The preprocessing steps are fitted once per fold into a cache
+    shared by all searches, every family's pipeline starts with the same steps and the searches use
+    the same folds. The policy's cores are divided between the families trained at the same time, and
+    each family's share between its parallel fits and their threads.
+    Models are saved by this process as their training finishes, so the manifest has a single writer.
+
+    Parameters:
+        models (List[str]): Model families, e.g. ['xgb', 'lgbm']
+        version (float): Version of every trained model, by default the next version of each family
+        search (SearchStrategy): Hyperparameter search strategy
+        budget (int): Number of parameter combinations sampled by random/halving search
+        artifact_format (ArtifactFormat): Format the models are saved in
+        policy (ResourcePolicy): Cores used and threads of each fit, all cores and one thread by default
+        early_stopping_rounds (int): Patience of the boosted models trained with early stopping, None trains
+            them over the grid of rounds
+        imbalance (ImbalanceStrategy): How the class imbalance is handled, resampling or class weights
+        threshold_objective (ThresholdObjective): Objective the decision threshold of every model is tuned for
+            on out-of-fold predictions, None predicts the most probable class
+        target_recall (float): Recall of the positive class reached by the recall objective
+        collect_oof (bool): Save the out-of-fold predictions of every model for stacking ensembles
+
+    Returns:
+        pd.DataFrame: Leaderboard of the trained models, best first.
+    """
+    for model in models:
+        build_model_pipeline(model)
+    versions = {model: _next_version(model) if version is None else version for model in models}
+    policy = policy or ResourcePolicy()
+    policies = policy.split(len(models))
+    logger.info(f"Training {', '.join(models)} using {search.value} search, {imbalance.value} imbalance strategy, "
+                f"{policy}, {len(policies)} models at a time")
+
+    split = load_train_test_split()
+    X_train, y_train = split[0], split[2]
+    results = []
+    with tempfile.TemporaryDirectory(prefix='pipeline_cache_') as cache_dir:
+        # Once per kind of pipeline, early stopping pipelines fit their steps without the validation split
+        searches = [_build_search(model, search, budget, early_stopping_rounds, imbalance, y_train) for model in models]
+        with policy.limits():
+            for pipeline_search in {type(search_cv.estimator): search_cv for search_cv in searches}.values():
+                fit_cached_pipeline_steps(pipeline_search, X_train, y_train, cache_dir, n_jobs=policy.outer_jobs)
+
+        with ProcessPoolExecutor(max_workers=len(policies)) as executor:
+            futures = {executor.submit(_fit_and_evaluate, model, split, search, budget, early_stopping_rounds,
+                                       imbalance, policies[i % len(policies)], cache_dir, threshold_objective,
+                                       target_recall, collect_oof): model
+                       for i, model in enumerate(models)}
+            for future in as_completed(futures):
+                model = futures[future]
+                try:
+                    pipeline, metrics, fit_time, oof_proba = future.result()
+                except Exception as error:
+                    logger.error(f"Training {model} failed: {error}")
+                    continue
+                _save(pipeline, model, versions[model], metrics, split, artifact_format, oof_proba)
+                results.append({'model': model, 'version': str(versions[model]), 'cv_score': pipeline.best_score_,
+                                **metrics, 'threshold': getattr(pipeline, DECISION_THRESHOLD, None),
+                                'fit_time': fit_time})
+
+    if not results:
+        raise RuntimeError(f"Training failed for every model: {', '.join(models)}")
+    leaderboard = pd.DataFrame(results).sort_values('f1_score', ascending=False, ignore_index=True)
+    logger.info(f"Leaderboard:\n{leaderboard.to_string(index=False, float_format='{:.4f}'.format)}")
+    save_data(leaderboard, LEADERBOARD_FILE)
+    return leaderboard
+
+
+def _boosting_start(estimator):
+    """The fitted model boosting continues from, XGBoost keeps the rounds after the best one when it stops early"""
+    if type(estimator).__module__.startswith('xgboost') and estimator.get_booster().attr('best_iteration') is not None:
+        return estimator.get_booster()[:estimator.best_iteration + 1]
+    return estimator
+
+
+def _continue_boosting(pipeline, X_new: pd.DataFrame, y_new: pd.Series, family: ModelFamily, rounds: int):
+    """
+    Updates the statistics of the pipeline's steps with new rows and adds boosting rounds fitted on them.
+
+    Steps with a `partial_fit` add the rows to their running counts, the others keep their fitted state.
+    The rows are resampled like the training data, samplers refitted on them.
+    """
+    Xt, yt = X_new, y_new
+    for _, step in pipeline.steps[:-1]:
+        if step in (None, 'passthrough'):
+            continue
+        if hasattr(step, 'partial_fit'):
+            step.partial_fit(Xt, y_new)
+        if hasattr(step, 'fit_resample'):
+            Xt, yt = clone(step).fit_resample(Xt, yt)
+        else:
+            Xt = step.transform(Xt)
+
+    name, estimator = pipeline.steps[-1]
+    library = type(estimator).__module__.split('.')[0]
+    # The rows are too few to hold out an early stopping split, exactly `rounds` rounds are added
+    updated = clone(estimator).set_params(**{family.rounds_param: rounds, PATIENCE_PARAMS[library]: None})
+    updated.fit(Xt, yt, **{family.warm_start: _boosting_start(estimator)})
+    pipeline.steps[-1] = (name, updated)
+    return pipeline
+
+
+def train_incremental(model: str,
+                      data_file: str,
+                      version: float = None,
+                      rounds: int = 50,
+                      artifact_format: ArtifactFormat = ArtifactFormat.COMPRESSED) -> Dict[str, float]:
+    """
+    Updates the latest saved version of a model with new labelled rows instead of training it from scratch.
+
+    No search is run, the best parameters of the previous version are kept. Boosted models update the
+    preprocessing statistics kept as running counts, the imputation values and target encoding means, with
+    the new rows, and continue boosting from the previous booster on them. The other families are refitted
+    with the best parameters on the training split and the new rows. The decision threshold of the previous
+    version is kept.
+
+    Parameters:
+        model (str): Model family, e.g. xgb
+        data_file (str): CSV file of the new rows, with their labels, in the raw data directory
+        version (float): Version of the updated model, by default the next one
+        rounds (int): Boosting rounds added on the new rows
+        artifact_format (ArtifactFormat): Format the model is saved in
+
+    Returns:
+        Dict[str, float]: Metrics of the updated model on the test split
+    """
+    previous_file = get_latest_model_file(model)
+    if previous_file is None:
+        raise ValueError(f"No saved {model} model to update, train one first")
+    family = get_model_family(model)
+    version = _next_version(model) if version is None else version
+
+    data = load_data(data_file, dtype=RAW_DTYPES)
+    X_new, y_new = data.drop(columns=['Depression']), data['Depression']
+    split = load_train_test_split()
+    X_train, X_test, y_train, y_test = split
+
+    # Loaded models are shared through the model cache, the update works on a copy
+    search = copy.deepcopy(load_model(previous_file))
+    logger.info(f"Updating {previous_file} to version {version} with {len(X_new)} rows of {data_file}, "
+                f"best parameters: {search.best_params_}")
+    start = time.perf_counter()
+    if family.warm_start is None:
+        logger.info(f"{model} cannot continue training, refitting it on the training split and the new rows")
+        search.best_estimator_ = clone(search.best_estimator_).fit(pd.concat([X_train, X_new]),
+                                                                   pd.concat([y_train, y_new]))
     else:
-        logger.error(f"Model {model} not supported")
-        raise ValueError(f"Model {model} not supported")
+        search.best_estimator_ = _continue_boosting(search.best_estimator_, X_new, y_new, family, rounds)
+    logger.info(f"Updated {model} in {time.perf_counter() - start:.2f}s")
+
+    metrics = _evaluate(search, X_test, y_test)
+    _save(search, model, version, metrics, split, artifact_format)
+    return metrics
+
+
+def stack_models(members: List[str], version: float = None) -> Dict[str, float]:
+    """
+    Fits a stacking ensemble of saved models on their out-of-fold predictions and saves it as a stack model.
+
+    The members must have been trained with their out-of-fold predictions collected, on the current training
+    split. The ensemble is evaluated on the test split, its members scoring it concurrently.
 
-    # Train model
-    pipeline.fit(X_train, y_train)
+    Parameters:
+        members (List[str]): Base models, by name for their latest version or with a version, e.g. xgb:4.0
+        version (float): Version of the ensemble, by default the next one
 
-    # Make predictions
-    y_pred = pipeline.predict(X_test)
+    Returns:
+        Dict[str, float]: Metrics of the ensemble on the test split
+    """
+    version = _next_version(STACK_MODEL) if version is None else version
+    X_train, X_test, y_train, y_test = load_train_test_split()
+    store = OOFStore()
+    ensemble = build_stacking_ensemble(members, store)
+    if store.load(ensemble.members[0])[1] != split_fingerprint(X_train, y_train):
+        raise ValueError("The members were cross-validated on another training split, the training data changed")
 
-    # Evaluate
-    metrics = evaluate_classification_model(y_test, y_pred)
+    y_proba = ensemble.predict_proba(X_test)
+    metrics = evaluate_classification_model(y_test, apply_threshold(y_proba, ensemble.classes_), y_proba[:, 1])
+    log_metrics(metrics, logger, bootstrap_confidence_intervals(y_test, y_proba[:, 1]))
+    save_model(ensemble, f'{STACK_MODEL}_v{version}.joblib', metrics=metrics,
+               features={column: str(dtype) for column, dtype in X_train.dtypes.items()})
+    return metrics
 
-    # Log evaluation metrics
-    log_metrics(metrics, logger)
 
-    save_model(pipeline, f'{model}_v{version}.joblib')
+def evaluate_model(model_name: str, version: float = None, chunksize: int = None, n_jobs: int = None):
+    model_file = get_model_file(model_name, version)
 
+    if chunksize is not None:
+        # Stream the test file so memory stays bounded by the chunk size
+        score_in_chunks(model_file, 'test.csv', 'submission/submission.csv', chunksize=chunksize, n_jobs=n_jobs)
+        return
 
-def evaluate_model(model_name: str, version: float = None):
-    X = load_data('test.csv')
+    X = load_data('test.csv', dtype=RAW_DTYPES, cache=True)
 
-    model = load_model(f'{model_name}_v{version}.joblib')
-    y_pred = model.predict(X)
+    model = load_model(model_file)
+    y_pred = predict_with_threshold(model, X)
 
     submission_df = pd.DataFrame({'id': X['id'], 'Depression': y_pred})
 
@@ -2,18 +2,18 @@ from imblearn.pipeline import Pipeline
 from xgboost import XGBClassifier
 
 from src.pipeline.base_pipeline import get_base_pipeline_steps
-from src.validation.grid_search import build_grid_search_cv
+from src.pipeline.early_stopping import build_early_stopping_pipeline
+from src.validation.grid_search import SearchStrategy, build_grid_search_cv
 
 
-def build_xgb_pipeline():
+def build_xgb_pipeline(search: SearchStrategy = SearchStrategy.GRID, budget: int = None,
+                       early_stopping_rounds: int = None):
     xgb = XGBClassifier(eval_metric="logloss")
 
     base_pipeline_steps = get_base_pipeline_steps()
     # Add model to pipeline
     base_pipeline_steps.append(('xgb', xgb))
 
-    pipeline = Pipeline(base_pipeline_steps)
-
     xgb_param_grid = {
         # 'oversampling__sampling_strategy': ['auto', 0.5, 0.8],
         # 'oversampling__k_neighbors': [3, 5, 7],
@@ -25,4 +25,10 @@ def build_xgb_pipeline():
         'xgb__scale_pos_weight': [1, 10, 50]
     }
 
-    return build_grid_search_cv(pipeline, xgb_param_grid)
+    if early_stopping_rounds is None:
+        pipeline = Pipeline(base_pipeline_steps)
+    else:
+        pipeline, xgb_param_grid = build_early_stopping_pipeline(base_pipeline_steps, xgb_param_grid,
+                                                                 'xgb__n_estimators', early_stopping_rounds, search)
+
+    return build_grid_search_cv(pipeline, xgb_param_grid, search=search, budget=budget, resource='xgb__n_estimators')
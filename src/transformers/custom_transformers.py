@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
@@ -46,3 +47,9 @@ class GenerateInteractionFeatures(BaseEstimator, TransformerMixin):
     def transform(self, X):
         X = self.feature_engineer.transform(X)
         return X
+
+    def get_feature_names_out(self, input_features=None):
+        # Fitted on a DataFrame, the input columns are not part of the step's state
+        if input_features is None:
+            return np.asarray(self.feature_engineer.schema_.names, dtype=object)
+        return np.asarray(list(input_features) + self.feature_engineer.interaction_names_, dtype=object)
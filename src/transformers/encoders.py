@@ -1,7 +1,16 @@
+from enum import Enum
+from typing import Optional, Tuple
+
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder, LabelEncoder
+from sklearn.preprocessing import LabelEncoder
+
+from src.transformers.schema import FeatureArray, FeatureSchema
+from utils.logger import get_logger
+
+logger = get_logger("Encoders")
 
 
 class TargetEncoder(BaseEstimator, TransformerMixin):
@@ -13,7 +22,9 @@ class TargetEncoder(BaseEstimator, TransformerMixin):
         # Calculate target means for each column using X and y
         for col in self.columns:
             temp_df = pd.DataFrame({col: X[col], 'Depression': y})
-            self.encoding_maps[col] = temp_df.groupby(col)['Depression'].mean()
+            means = temp_df.groupby(col, observed=True)['Depression'].mean()
+            means.index = means.index.astype(object)
+            self.encoding_maps[col] = means
 
         return self
 
@@ -22,7 +33,13 @@ class TargetEncoder(BaseEstimator, TransformerMixin):
             X = pd.DataFrame(X, columns=self.columns)
 
         for col in self.columns:
-            X[col] = X[col].map(self.encoding_maps[col])
+            if isinstance(X[col].dtype, pd.CategoricalDtype):
+                # Look up each category once and broadcast to the rows through the integer codes,
+                # missing values (code -1) pick up the trailing NaN
+                means = self.encoding_maps[col].reindex(X[col].cat.categories).to_numpy(dtype=float)
+                X[col] = np.append(means, np.nan)[X[col].cat.codes.to_numpy()]
+            else:
+                X[col] = X[col].map(self.encoding_maps[col])
         return X
 
     def get_feature_names_out(self, input_features=None):
@@ -41,16 +58,40 @@ class LabelEncoderTransformer(BaseEstimator, TransformerMixin):
             X = pd.DataFrame(X, columns=self.columns)
 
         for col in self.columns:
-            X[col] = X[col].astype(str).replace('Not Applicable', '0')
+            if isinstance(X[col].dtype, pd.CategoricalDtype):
+                # Only the observed categories are labels, missing values become 'nan' as with strings
+                codes = X[col].cat.codes.to_numpy()
+                labels = X[col].cat.categories[np.unique(codes[codes >= 0])].astype(str)
+                labels = labels.append(pd.Index(['nan'])) if (codes < 0).any() else labels
+            else:
+                labels = X[col].astype(str)
             le = LabelEncoder()
-            le.fit(X[col])
+            le.fit(pd.Series(labels).replace('Not Applicable', '0'))
             self.label_encoders[col] = le
         return self
 
+    def _transform_codes(self, values: pd.Series, le: LabelEncoder) -> np.ndarray:
+        """Encodes a categorical column by mapping its categories once and indexing with the codes."""
+        categories = np.append(values.cat.categories.astype(str), 'nan')
+        known = np.isin(categories, le.classes_)
+        lookup = np.full(len(categories), -1)
+        lookup[known] = le.transform(categories[known])
+        # Unseen categories fall back to '0' like unseen strings do
+        if '0' in le.classes_:
+            lookup[~known] = le.transform(['0'])[0]
+        encoded = lookup[values.cat.codes.to_numpy()]
+        if (encoded < 0).any():
+            raise ValueError(f"Column {values.name} contains previously unseen labels")
+        return encoded
+
     def transform(self, X):
         X = X.copy()
 
         for col in self.columns:
+            if isinstance(X[col].dtype, pd.CategoricalDtype):
+                X[col] = self._transform_codes(X[col], self.label_encoders[col])
+                continue
+
             unseen_mask = ~X[col].isin(self.label_encoders[col].classes_)
 
             if unseen_mask.any():
@@ -64,26 +105,201 @@ class LabelEncoderTransformer(BaseEstimator, TransformerMixin):
         return self.columns
 
 
+class EncodedOutput(Enum):
+    FRAME = 'frame'
+    ARRAY = 'array'
+    SPARSE = 'sparse'
+
+
+def _category_positions(values: pd.Series, vocabulary: pd.Index, as_string: bool = False) -> np.ndarray:
+    """
+    Looks up the position of every value of a column in `vocabulary`, -1 for values outside of it.
+
+    Each category is looked up once and broadcast to the rows through the integer category codes,
+    missing values (code -1) are looked up as NaN, or as 'nan' when matching on strings.
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    categories = values.cat.categories.append(pd.Index([np.nan]))
+    lookup = vocabulary.get_indexer(categories.astype(str) if as_string else categories)
+    return lookup[values.cat.codes.to_numpy()]
+
+
+def _target_statistics(values: pd.Series, y) -> Tuple[pd.Index, np.ndarray, np.ndarray]:
+    """Observed categories of a column, as with TargetEncoder, with the sum of the target and the rows of each"""
+    frame = pd.DataFrame({values.name: values, 'Depression': y})
+    statistics = frame.groupby(values.name, observed=True)['Depression']
+    sums, counts = statistics.sum(), statistics.count()
+    return sums.index.astype(object), sums.to_numpy(dtype=float), counts.to_numpy(dtype=np.int64)
+
+
+def _target_table(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Target means of the categories, the trailing entry is used for unseen values
+    return np.append(sums / counts, np.nan)
+
+
 # Custom Transformer for encoding categorical features
 class EncodeCategoricalFeatures(BaseEstimator, TransformerMixin):
-    def __init__(self, one_hot_features, target_encoded_features, label_encoded_features):
+    """
+    One-hot, target and label encodes categorical columns and passes the remaining columns through.
+
+    Every encoding is fitted into a lookup table indexed by category code, so transform writes the
+    encoded columns straight into a single block of `dtype`. `output` selects what transform returns:
+    a DataFrame named like a ColumnTransformer output, the dense array, or a CSR matrix with a sparse
+    one-hot block for estimators that accept sparse input. The dense array is a `FeatureArray` carrying
+    `schema_`, the slot of every output column, which the interaction step resolves its columns from.
+    """
+
+    def __init__(self, one_hot_features, target_encoded_features, label_encoded_features,
+                 output: EncodedOutput = EncodedOutput.FRAME, dtype: np.dtype = np.float64):
         self.one_hot_features = one_hot_features
         self.target_encoded_features = target_encoded_features
         self.label_encoded_features = label_encoded_features
-        self.transformer = None
+        self.output = output
+        self.dtype = dtype
+
+    def __setstate__(self, state):
+        # Models saved before the output could be selected always returned a float64 DataFrame
+        state.setdefault('output', EncodedOutput.FRAME)
+        state.setdefault('dtype', np.float64)
+        if 'feature_names_out_' in state and 'schema_' not in state:
+            state['schema_'] = FeatureSchema(state['feature_names_out_'], state['dtype'])
+        super().__setstate__(state)
 
     def fit(self, X, y):
-        self.transformer = ColumnTransformer(
-            transformers=[
-                ('onehot', OneHotEncoder(sparse_output=False), self.one_hot_features),
-                ('target_encoding', TargetEncoder(self.target_encoded_features), self.target_encoded_features),
-                ('label_encoding', LabelEncoderTransformer(self.label_encoded_features), self.label_encoded_features)
-            ],
-            remainder='passthrough'
+        encoded = set(self.one_hot_features) | set(self.target_encoded_features) | set(self.label_encoded_features)
+        self.remainder_features_ = [column for column in X.columns if column not in encoded]
+
+        # One-hot categories are the sorted observed values, missing values last, as with OneHotEncoder
+        self.one_hot_categories_ = {}
+        for column in self.one_hot_features:
+            values = X[column].dropna().unique()
+            categories = np.sort(np.asarray(values, dtype=object))
+            if X[column].isna().any():
+                categories = np.append(categories, np.nan)
+            self.one_hot_categories_[column] = pd.Index(categories, dtype=object)
+
+        # Target and label encodings become value tables, the trailing entry is used for unseen values.
+        # The target means come from sums and counts which partial_fit adds new rows to
+        self.target_counts_ = {}
+        self.target_tables_ = {}
+        for column in self.target_encoded_features:
+            vocabulary, sums, counts = _target_statistics(X[column], y)
+            self.target_counts_[column] = (sums, counts)
+            self.target_tables_[column] = (vocabulary, _target_table(sums, counts))
+        label_encoder = LabelEncoderTransformer(self.label_encoded_features).fit(X)
+        self.label_tables_ = {}
+        for column, le in label_encoder.label_encoders.items():
+            # Unseen labels fall back to '0' when it is a known label, otherwise transform raises
+            fallback = le.transform(['0'])[0] if '0' in le.classes_ else -1
+            self.label_tables_[column] = (pd.Index(le.classes_), np.append(np.arange(len(le.classes_)), fallback))
+
+        self.feature_names_out_ = (
+            [f'onehot__{column}_{category}'
+             for column, categories in self.one_hot_categories_.items() for category in categories]
+            + [f'target_encoding__{column}' for column in self.target_encoded_features]
+            + [f'label_encoding__{column}' for column in self.label_encoded_features]
+            + [f'remainder__{column}' for column in self.remainder_features_]
         )
-        self.transformer.fit(X, y)
+        self.schema_ = FeatureSchema(self.feature_names_out_, self.dtype)
+        return self
+
+    def partial_fit(self, X, y):
+        """
+        Updates the target encoding means with new rows, from the running sums and counts of the target.
+
+        Categories seen for the first time are added to the target tables. The one-hot and label encodings
+        keep their vocabulary, so the output columns do not change.
+        """
+        if not hasattr(self, 'feature_names_out_'):
+            return self.fit(X, y)
+        # Models saved before the encoder kept its counts cannot be updated without the rows they saw
+        if not hasattr(self, 'target_counts_'):
+            logger.warning("The target encoding was fitted without counts, its means are not updated")
+            return self
+
+        target_counts, target_tables = {}, {}
+        for column, (vocabulary, _) in self.target_tables_.items():
+            new_vocabulary, new_sums, new_counts = _target_statistics(X[column], y)
+            vocabulary = vocabulary.append(new_vocabulary.difference(vocabulary, sort=False))
+            sums, counts = (np.pad(values, (0, len(vocabulary) - len(values)))
+                            for values in self.target_counts_[column])
+            positions = vocabulary.get_indexer(new_vocabulary)
+            sums[positions] += new_sums
+            counts[positions] += new_counts
+            target_counts[column] = (sums, counts)
+            target_tables[column] = (vocabulary, _target_table(sums, counts))
+        self.target_counts_, self.target_tables_ = target_counts, target_tables
         return self
 
+    def _one_hot_positions(self, X) -> np.ndarray:
+        """Output column of every row's category, one row per one-hot encoded feature."""
+        positions = np.empty((len(self.one_hot_features), len(X)), dtype=np.intp)
+        offset = 0
+        for i, (column, categories) in enumerate(self.one_hot_categories_.items()):
+            np.add(_category_positions(X[column], categories), offset, out=positions[i])
+            if (positions[i] < offset).any():
+                raise ValueError(f"Column {column} contains previously unseen categories")
+            offset += len(categories)
+        return positions
+
+    def _dense_values(self, X, one_hot_positions: Optional[np.ndarray]) -> np.ndarray:
+        """Encoded columns as the rows of a column-major block, without the one-hot block if no positions are given."""
+        n_one_hot = sum(len(categories) for categories in self.one_hot_categories_.values())
+        n_skipped = 0 if one_hot_positions is not None else n_one_hot
+        values = np.empty((len(self.feature_names_out_) - n_skipped, len(X)), dtype=self.dtype)
+
+        row = 0
+        if one_hot_positions is not None:
+            for i, categories in enumerate(self.one_hot_categories_.values()):
+                for _ in categories:
+                    np.equal(one_hot_positions[i], row, out=values[row], casting='unsafe')
+                    row += 1
+        for column, (vocabulary, table) in self.target_tables_.items():
+            # Gathered in the table's float64 and cast on assignment, a casting `out=` warns on NaN
+            values[row] = table[_category_positions(X[column], vocabulary)]
+            row += 1
+        for column, (vocabulary, table) in self.label_tables_.items():
+            encoded = table[_category_positions(X[column], vocabulary, as_string=True)]
+            if (encoded < 0).any():
+                raise ValueError(f"Column {column} contains previously unseen labels")
+            values[row] = encoded
+            row += 1
+        for column in self.remainder_features_:
+            values[row] = X[column].to_numpy(dtype=np.float64)
+            row += 1
+        return values
+
     def transform(self, X):
-        transformed = self.transformer.transform(X)
-        return pd.DataFrame(transformed, columns=self.transformer.get_feature_names_out())
+        # Models saved before the encoder worked on category codes keep their fitted ColumnTransformer
+        if not hasattr(self, 'feature_names_out_'):
+            transformed = self.transformer.transform(X)
+            return pd.DataFrame(transformed, columns=self.transformer.get_feature_names_out())
+
+        one_hot_positions = self._one_hot_positions(X)
+        output = EncodedOutput(self.output)
+
+        if output == EncodedOutput.SPARSE:
+            # Each row holds one non-zero per one-hot encoded feature followed by its non-zero dense values,
+            # assembled row by row straight into the CSR arrays
+            n_one_hot = sum(len(categories) for categories in self.one_hot_categories_.values())
+            dense = self._dense_values(X, None).T
+            n_dense = dense.shape[1]
+            data = np.hstack([np.ones((len(X), len(one_hot_positions)), dtype=dense.dtype), dense])
+            indices = np.hstack([one_hot_positions.T, np.broadcast_to(np.arange(n_one_hot, n_one_hot + n_dense),
+                                                                        dense.shape)])
+            stored = data != 0
+            indptr = np.zeros(len(X) + 1, dtype=np.intp)
+            np.cumsum(stored.sum(axis=1), out=indptr[1:])
+            return sparse.csr_matrix((data[stored], indices[stored], indptr), shape=(len(X), n_one_hot + n_dense))
+
+        values = self._dense_values(X, one_hot_positions)
+        if output == EncodedOutput.ARRAY:
+            # Column-major: every feature is a contiguous run of memory
+            return FeatureArray(values.T, self.schema_)
+        return pd.DataFrame(values.T, columns=self.feature_names_out_, copy=False)
+
+    def get_feature_names_out(self, input_features=None):
+        if not hasattr(self, 'feature_names_out_'):
+            return self.transformer.get_feature_names_out()
+        return np.asarray(self.feature_names_out_, dtype=object)
@@ -1,11 +1,33 @@
+import numpy as np
+import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from src.transformers.schema import FeatureArray
+
+# Row groups an interaction can be restricted to, rows outside the group keep the default value
+NO_MASK, STUDENT_MASK, WORKING_PROFESSIONAL_MASK = 0, 1, 2
+
 
 class InteractionFeatureEngineer(BaseEstimator, TransformerMixin):
+    """
+    Appends products of pairs of encoded columns, optionally restricted to students or working professionals.
+
+    Fitted on a `FeatureArray`, the source columns are resolved to slots of its schema once and transform
+    works on arrays of the same layout, returning a plain array described by `schema_`. Fitted on a
+    DataFrame, columns are looked up by name on every call and transform returns a DataFrame.
+    """
+
     def __init__(self, from_pipeline=True):
         super().__init__()
         self.from_pipeline = from_pipeline
 
+    def __setstate__(self, state):
+        # Models saved before the interactions were compiled at fit time are compiled on their first batch,
+        # with the names they were trained with: the Age interactions reused the Job Satisfaction names
+        if 'interaction_names_' not in state:
+            state.setdefault('legacy_names_', True)
+        super().__setstate__(state)
+
     def _handle_remainder_column_name(self, column_name):
         """Adjust column names based on whether data is from a pipeline."""
         return f'remainder__{column_name}' if self.from_pipeline else column_name
@@ -18,31 +40,10 @@ class InteractionFeatureEngineer(BaseEstimator, TransformerMixin):
         """Adjust label encoded column names based on whether data is from a pipeline."""
         return f'target_encoding__{column_name}' if self.from_pipeline else column_name
 
-    def _create_interaction(self, X, col1, col2, new_col_name, mask=None, default_value=-1.0):
-        """
-        Create a new column in X representing the interaction between col1 and col2.
-        Apply a mask if provided and initialize with a default value.
-        """
-        X[new_col_name] = default_value
-        if mask is not None:
-            X.loc[mask, new_col_name] = (
-                    X.loc[mask, col1].values * X.loc[mask, col2].values
-            )
-        else:
-            X[new_col_name] = X[col1] * X[col2]
-        return X
-
-    def fit(self, X, y=None):
-        # No fitting needed; the logic is independent of data distribution
-        return self
-
-    def transform(self, X, y=None):
-        # Copy input data to avoid modifying the original DataFrame
-        X = X.copy()
-
-        # Mask for students
-        student_mask = X[self._handle_remainder_column_name('CGPA')] > 0
-        working_professionals_mask = X[self._handle_remainder_column_name('CGPA')] == -1
+    def _interaction_specs(self):
+        """Lists the interactions as (col1, col2, new_col, mask) dicts, in the order the columns are created."""
+        student_mask = STUDENT_MASK
+        working_professionals_mask = WORKING_PROFESSIONAL_MASK
 
         # Interaction configurations
         interactions = [
@@ -123,11 +124,12 @@ class InteractionFeatureEngineer(BaseEstimator, TransformerMixin):
             })
 
         # Age × Sleep Duration
+        age_prefix = 'Job Satisfaction' if getattr(self, 'legacy_names_', False) else 'Age'
         for cat in sleep_duration_categories:
             interactions.append({
                 "col1": self._handle_remainder_column_name('Age'),
                 "col2": cat,
-                "new_col": f"Job Satisfaction x {cat.split('__')[-1]}",
+                "new_col": f"{age_prefix} x {cat.split('__')[-1]}",
             })
 
         role_categories = [
@@ -199,14 +201,75 @@ class InteractionFeatureEngineer(BaseEstimator, TransformerMixin):
             for cat in sleep_duration_categories
         ])
 
-        # Apply all interactions
-        for interaction in interactions:
-            X = self._create_interaction(
-                X,
-                interaction["col1"],
-                interaction["col2"],
-                interaction["new_col"],
-                mask=interaction.get("mask"),
-            )
-
-        return X
+        return interactions
+
+    def fit(self, X, y=None):
+        """
+        Compiles the interactions into column index arrays.
+
+        The interactions do not depend on the data distribution, only on the column names. An interaction
+        whose name is reused replaces the earlier one but keeps its position, which only happens with the
+        names of models saved before the Age interactions were named after Age.
+        """
+        compiled = {}
+        for interaction in self._interaction_specs():
+            compiled[interaction["new_col"]] = (interaction["col1"], interaction["col2"],
+                                                interaction.get("mask", NO_MASK))
+
+        self.interaction_names_ = list(compiled)
+        self.source_columns_ = list(dict.fromkeys(
+            [self._handle_remainder_column_name('CGPA')]
+            + [column for col1, col2, _ in compiled.values() for column in (col1, col2)]
+        ))
+        column_index = {column: i for i, column in enumerate(self.source_columns_)}
+        self.left_index_ = np.array([column_index[col1] for col1, _, _ in compiled.values()])
+        self.right_index_ = np.array([column_index[col2] for _, col2, _ in compiled.values()])
+        self.mask_index_ = np.array([mask for _, _, mask in compiled.values()])
+
+        if isinstance(X, FeatureArray) and X.schema is not None:
+            self.input_schema_ = X.schema
+            self.source_slots_ = X.schema.slots(self.source_columns_)
+            self.schema_ = X.schema.extend(self.interaction_names_)
+        return self
+
+    def _interactions(self, columns: np.ndarray, source: np.ndarray, out: np.ndarray) -> None:
+        """Writes the interactions of the columns, given as the rows of a column-major block, into the rows of out"""
+        left, right = source[self.left_index_], source[self.right_index_]
+        for i in range(len(out)):
+            np.multiply(columns[left[i]], columns[right[i]], out=out[i])
+
+        # Rows outside an interaction's group get the default value
+        cgpa = columns[source[0]]
+        outside_group = {STUDENT_MASK: ~(cgpa > 0), WORKING_PROFESSIONAL_MASK: ~(cgpa == -1)}
+        for i in np.flatnonzero(self.mask_index_ != NO_MASK):
+            np.putmask(out[i], outside_group[self.mask_index_[i]], -1.0)
+
+    def transform(self, X, y=None):
+        # Models saved before the interactions were compiled at fit time
+        if not hasattr(self, 'interaction_names_'):
+            self.fit(X)
+
+        if not isinstance(X, pd.DataFrame):
+            if not hasattr(self, 'source_slots_'):
+                raise TypeError("The interactions were fitted without a feature schema, transform a DataFrame")
+            if X.shape[1] != len(self.input_schema_):
+                raise ValueError(f"Expected {len(self.input_schema_)} features, got {X.shape[1]}")
+            # Input and interactions share one column-major block in the input's dtype, returned as a
+            # plain array whose columns are described by `schema_`
+            n_columns = X.shape[1]
+            values = np.empty((n_columns + len(self.interaction_names_), len(X)), dtype=self.schema_.dtype)
+            values[:n_columns] = np.asarray(X).T
+            self._interactions(values[:n_columns], self.source_slots_, values[n_columns:])
+            return values.T
+
+        n_columns = X.shape[1]
+        source = X.columns.get_indexer(self.source_columns_)
+        if (source < 0).any():
+            raise KeyError(f"Missing interaction columns: {np.array(self.source_columns_)[source < 0].tolist()}")
+
+        # Input and interactions are written into a single column-major block, the way pandas stores it,
+        # so every column is a contiguous row and the result needs no concatenation
+        values = np.empty((n_columns + len(self.interaction_names_), len(X)))
+        values[:n_columns] = X.to_numpy(dtype=np.float64).T
+        self._interactions(values[:n_columns], source, values[n_columns:])
+        return pd.DataFrame(values.T, columns=list(X.columns) + self.interaction_names_, index=X.index, copy=False)
@@ -1,19 +1,82 @@
+import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
 
-from src.data.data_preprocessing import preprocess_data
+from src.data.data_preprocessing import (preprocess_data, convert_data_types, handle_missing_values, handle_outliers,
+                                         add_counts, compute_imputation_counts, imputation_values_from_counts,
+                                         compute_category_counts, frequent_categories_from_counts)
+from utils.logger import get_logger
+
+logger = get_logger("Data Preprocessor")
 
 
 class DataPreprocessor(BaseEstimator, TransformerMixin):
-    def __init__(self):
-        pass  # Add parameters here if you want to make the preprocessing customizable
+    def __init__(self, threshold: int = 20, copy: bool = True):
+        self.threshold = threshold
+        # Set copy=False to preprocess the input frame in place when the caller no longer needs the raw data
+        self.copy = copy
+
+    def __setstate__(self, state):
+        # Models saved before the preprocessor had parameters do not carry them in their state
+        state.setdefault('threshold', 20)
+        state.setdefault('copy', True)
+        super().__setstate__(state)
 
     def fit(self, X, y=None):
-        # No fitting needed for preprocessing, but this method must exist
+        # Learn the imputation values and frequent categories once so transform does not depend on the batch,
+        # from value counts which partial_fit adds new rows to
+        data = convert_data_types(X.drop(columns=['id', 'Name'], errors='ignore'), inplace=True)
+        self.imputation_counts_ = compute_imputation_counts(data)
+        self.imputation_values_ = imputation_values_from_counts(self.imputation_counts_)
+        data = handle_missing_values(data, self.imputation_values_, inplace=True)
+        self.category_counts_ = compute_category_counts(data)
+        self.frequent_categories_ = frequent_categories_from_counts(self.category_counts_, self.threshold)
+        data = handle_outliers(data, frequent_categories=self.frequent_categories_, inplace=True)
+        # Fix the category vocabulary of every column so category codes are stable across batches
+        self.categories_ = {column: data[column].cat.categories
+                            for column in data.columns if data[column].dtype == 'category'}
         return self
 
-    def transform(self, X):
-        # Apply your preprocessing function
-        return preprocess_data(X)
+    def partial_fit(self, X, y=None):
+        """
+        Adds new rows to the value counts and updates the imputation values from them.
 
+        The category vocabulary stays the one learned by fit, as the steps after the preprocessor and the
+        model were fitted on it: a category becoming frequent with the new rows is counted, and kept from
+        the next full fit on.
+        """
+        if not hasattr(self, 'imputation_values_'):
+            return self.fit(X)
+        # Models saved before the preprocessor kept its counts cannot be updated without the rows they saw
+        if not hasattr(self, 'imputation_counts_'):
+            logger.warning("The preprocessor was fitted without value counts, its statistics are not updated")
+            return self
 
+        data = convert_data_types(X.drop(columns=['id', 'Name'], errors='ignore'), inplace=True)
+        new_counts = compute_imputation_counts(data)
+        self.imputation_counts_ = {column: add_counts(counts, new_counts[column])
+                                   for column, counts in self.imputation_counts_.items()}
+        self.imputation_values_ = imputation_values_from_counts(self.imputation_counts_)
+        data = handle_missing_values(data, self.imputation_values_, inplace=True)
+        new_counts = compute_category_counts(data)
+        self.category_counts_ = {column: add_counts(counts, new_counts[column])
+                                 for column, counts in self.category_counts_.items()}
 
+        frequent_categories = frequent_categories_from_counts(self.category_counts_, self.threshold)
+        for column, categories in frequent_categories.items():
+            known = np.isin(categories, self.categories_[column])
+            if not known.all():
+                logger.info(f"{column}: {', '.join(map(str, categories[~known]))} became frequent, "
+                            f"kept from the next full training on")
+        self.frequent_categories_ = {column: categories[np.isin(categories, self.categories_[column])]
+                                     for column, categories in frequent_categories.items()}
+        return self
+
+    def transform(self, X):
+        # Models saved before the preprocessor was stateful fall back to batch statistics
+        data = preprocess_data(X,
+                               getattr(self, 'imputation_values_', None),
+                               getattr(self, 'frequent_categories_', None),
+                               inplace=not self.copy)
+        for column, categories in getattr(self, 'categories_', {}).items():
+            data[column] = data[column].cat.set_categories(categories)
+        return data
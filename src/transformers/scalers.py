@@ -17,7 +17,9 @@ class ConditionalScaler(BaseEstimator, TransformerMixin):
     def transform(self, X):
         # Scale CGPA
         student_mask = X['CGPA'] > 0
-        X.loc[student_mask, 'CGPA'] = self.cgpa_scaler.transform(X.loc[student_mask, ['CGPA']]).flatten()
+        # Small inference batches may not contain any students
+        if student_mask.any():
+            X.loc[student_mask, 'CGPA'] = self.cgpa_scaler.transform(X.loc[student_mask, ['CGPA']]).flatten()
 
         # Scale Age
         X['Age'] = self.age_scaler.transform(X[['Age']]).flatten()
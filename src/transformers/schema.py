@@ -0,0 +1,65 @@
+from typing import Iterable, List
+
+import numpy as np
+
+
+class FeatureSchema:
+    """
+    Names, integer slots and dtype of the columns of a feature matrix, fixed when the step producing it is fitted.
+
+    Steps consuming the matrix resolve the slots of the features they need once, at fit time, and then index
+    plain arrays instead of looking columns up by name.
+    """
+
+    def __init__(self, names: Iterable[str], dtype: np.dtype = np.float32):
+        self.names = list(names)
+        self.dtype = np.dtype(dtype)
+        self._slots = {name: slot for slot, name in enumerate(self.names)}
+        if len(self._slots) != len(self.names):
+            duplicates = sorted({name for name in self.names if self.names.count(name) > 1})
+            raise ValueError(f"Duplicate feature names: {duplicates}")
+
+    def __len__(self):
+        return len(self.names)
+
+    def __eq__(self, other):
+        return isinstance(other, FeatureSchema) and self.names == other.names and self.dtype == other.dtype
+
+    def __repr__(self):
+        return f'FeatureSchema({len(self.names)} features, dtype={self.dtype})'
+
+    def slots(self, names: List[str]) -> np.ndarray:
+        """Slots of the given features, raises a KeyError listing the features not in the schema"""
+        missing = [name for name in names if name not in self._slots]
+        if missing:
+            raise KeyError(f"Features not in the schema: {missing}")
+        return np.array([self._slots[name] for name in names], dtype=np.intp)
+
+    def extend(self, names: Iterable[str]) -> 'FeatureSchema':
+        """Schema of the matrix with the given features appended"""
+        return FeatureSchema(self.names + list(names), self.dtype)
+
+
+class FeatureArray(np.ndarray):
+    """
+    Feature matrix carrying the schema of its columns from a fitted step to the next one.
+
+    Row selections, e.g. the folds of a search, keep the schema. Estimators and samplers see a plain ndarray.
+    """
+
+    def __new__(cls, values: np.ndarray, schema: FeatureSchema):
+        array = np.asarray(values).view(cls)
+        array.schema = schema
+        return array
+
+    def __array_finalize__(self, obj):
+        self.schema = getattr(obj, 'schema', None)
+
+    def __reduce__(self):
+        # Cached step outputs are pickled, the schema is kept next to the array state
+        reconstruct, arguments, state = super().__reduce__()
+        return reconstruct, arguments, (state, self.schema)
+
+    def __setstate__(self, state):
+        array_state, self.schema = state
+        super().__setstate__(array_state)
@@ -1,19 +1,180 @@
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from typing import Dict, Optional, Tuple
 
+import numpy as np
 
-def evaluate_classification_model(y_true, y_pred):
-    """Evaluates classification model performance."""
-    metrics = {
-        'accuracy': accuracy_score(y_true, y_pred),
-        'precision': precision_score(y_true, y_pred, average='weighted'),
-        'recall': recall_score(y_true, y_pred, average='weighted'),
-        'f1_score': f1_score(y_true, y_pred, average='weighted')
-    }
+from src.pipeline.options import ThresholdObjective
+
+# Attribute of a fitted model holding the probability from which it predicts the positive class
+DECISION_THRESHOLD = 'decision_threshold_'
+
+
+def _divide(numerator, denominator):
+    # Metrics with an empty denominator are 0, like scikit-learn's zero_division default
+    numerator, denominator = np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros(np.broadcast(numerator, denominator).shape),
+                     where=denominator > 0)
+
+
+def confusion_counts(y_true, y_pred, sample_weight=None) -> np.ndarray:
+    """Counts of true negatives, false positives, false negatives and true positives of binary labels"""
+    codes = 2 * np.asarray(y_true, dtype=np.intp) + np.asarray(y_pred, dtype=np.intp)
+    return np.bincount(codes, weights=sample_weight, minlength=4).astype(float)
+
+
+def metrics_from_counts(tn, fp, fn, tp) -> Dict[str, np.ndarray]:
+    """
+    Accuracy and support-weighted precision, recall and F1 of both classes, from confusion counts.
+
+    The counts may be arrays, e.g. one per threshold or per bootstrap resample, every metric then is an array.
+    """
+    negatives, positives = tn + fp, fn + tp
+    total = negatives + positives
+    precision = (negatives * _divide(tn, tn + fn) + positives * _divide(tp, tp + fp)) / total
+    recall = (negatives * _divide(tn, tn + fp) + positives * _divide(tp, tp + fn)) / total
+    f1 = (negatives * _divide(2 * tn, 2 * tn + fn + fp) + positives * _divide(2 * tp, 2 * tp + fp + fn)) / total
+    return {'accuracy': (tn + tp) / total, 'precision': precision, 'recall': recall, 'f1_score': f1}
+
+
+def threshold_curve(y_true, y_proba, sample_weight=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Confusion counts of every decision threshold, in one sort and two cumulative sums.
+
+    A record is predicted positive when its probability is at least the threshold. The thresholds are the
+    distinct probabilities, in decreasing order.
+
+    Parameters:
+        y_true: Binary labels
+        y_proba: Probability of the positive class
+        sample_weight: Weight of every record, or a 2D array of weights, one row per set of weights
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The thresholds, and the false and true positive counts from
+        each threshold on, with a leading axis per set of weights.
+    """
+    y_true, y_proba = np.asarray(y_true), np.asarray(y_proba)
+    order = np.argsort(-y_proba, kind='stable')
+    y_proba, positive = y_proba[order], y_true[order] == 1
+    weight = np.ones(len(y_true)) if sample_weight is None else np.asarray(sample_weight, dtype=float)[..., order]
+    # Last record of every run of equal probabilities, the counts are taken after it
+    ends = np.flatnonzero(np.r_[y_proba[1:] != y_proba[:-1], True])
+    tp = np.cumsum(weight * positive, axis=-1)[..., ends]
+    fp = np.cumsum(weight * ~positive, axis=-1)[..., ends]
+    return y_proba[ends], fp, tp
+
+
+def _roc_auc(fp: np.ndarray, tp: np.ndarray) -> np.ndarray:
+    # Area under the curve through the origin and every threshold, by the trapezoidal rule. It is undefined,
+    # NaN, when either class is absent
+    fpr = _divide(fp, fp[..., -1:])
+    tpr = _divide(tp, tp[..., -1:])
+    zeros = np.zeros(fp.shape[:-1] + (1,))
+    auc = np.trapz(np.concatenate([zeros, tpr], axis=-1), np.concatenate([zeros, fpr], axis=-1), axis=-1)
+    return np.where((fp[..., -1] > 0) & (tp[..., -1] > 0), auc, np.nan)
+
+
+def optimize_threshold(y_true, y_proba, objective: ThresholdObjective = ThresholdObjective.F1,
+                       target_recall: float = 0.9) -> float:
+    """
+    Decision threshold of the positive class optimizing an objective, over all the distinct probabilities.
+
+    Parameters:
+        y_true: Binary labels, e.g. of out-of-fold predictions
+        y_proba: Probability of the positive class
+        objective (ThresholdObjective): F1 maximizes the F1 score of the positive class, recall keeps its recall
+            at `target_recall` or above with the highest threshold
+        target_recall (float): Recall of the positive class reached by the recall objective
+
+    Returns:
+        float: The threshold
+    """
+    thresholds, fp, tp = threshold_curve(y_true, y_proba)
+    positives = tp[-1]
+    if objective == ThresholdObjective.F1:
+        return float(thresholds[np.argmax(_divide(2 * tp, tp + fp + positives))])
+    # The recall only grows as the threshold decreases, the first threshold reaching the target is the highest
+    return float(thresholds[np.argmax(_divide(tp, positives) >= target_recall)])
+
+
+def apply_threshold(y_proba: np.ndarray, classes: np.ndarray, threshold: Optional[float] = None) -> np.ndarray:
+    """Labels of probabilities of both classes, the most probable class when no threshold is given"""
+    if threshold is None:
+        return classes[np.argmax(y_proba, axis=1)]
+    return classes[(y_proba[:, 1] >= threshold).astype(np.intp)]
+
+
+def predict_with_threshold(model, X) -> np.ndarray:
+    """Predicts labels with the decision threshold stored with the model, if any"""
+    threshold = getattr(model, DECISION_THRESHOLD, None)
+    if threshold is None:
+        return model.predict(X)
+    return apply_threshold(model.predict_proba(X), model.classes_, threshold)
+
+
+def evaluate_classification_model(y_true, y_pred=None, y_proba=None, threshold: Optional[float] = None):
+    """
+    Evaluates classification model performance.
+
+    All the label metrics come from a single confusion count. With probabilities of the positive class, the
+    labels are taken from `threshold` (0.5 by default) and the ROC AUC is added.
+    """
+    if y_pred is None:
+        y_pred = np.asarray(y_proba) >= (0.5 if threshold is None else threshold)
+    metrics = {name: float(value) for name, value in metrics_from_counts(*confusion_counts(y_true, y_pred)).items()}
+    if y_proba is not None:
+        metrics['roc_auc'] = float(_roc_auc(*threshold_curve(y_true, y_proba)[1:]))
     return metrics
 
 
-def log_metrics(metrics, logger):
-    """Logs the calculated metrics."""
+def bootstrap_confidence_intervals(y_true, y_proba, threshold: Optional[float] = None, n_resamples: int = 1000,
+                                   confidence: float = 0.95, batch_size: int = 100,
+                                   random_state: int = 42) -> Dict[str, Tuple[float, float]]:
+    """
+    Percentile bootstrap confidence intervals of the metrics of `evaluate_classification_model`.
+
+    A resample is the number of times each record is drawn. Resamples are processed in batches as a matrix
+    of these counts, used as weights of the confusion counts and of a single threshold curve, so no resample
+    is sorted or indexed on its own.
+
+    Parameters:
+        y_true: Binary labels
+        y_proba: Probability of the positive class
+        threshold (Optional[float]): Decision threshold, 0.5 by default
+        n_resamples (int): Number of bootstrap resamples
+        confidence (float): Confidence level of the intervals
+        batch_size (int): Resamples drawn at a time, memory grows with `batch_size` times the number of records
+        random_state (int): Seed of the resamples
+
+    Returns:
+        Dict[str, Tuple[float, float]]: Lower and upper bound of every metric
+    """
+    y_true, y_proba = np.asarray(y_true), np.asarray(y_proba)
+    n = len(y_true)
+    rng = np.random.default_rng(random_state)
+    codes = 2 * y_true.astype(np.intp) + (y_proba >= (0.5 if threshold is None else threshold))
+    one_hot = np.eye(4)[codes]
+
+    samples = {}
+    for start in range(0, n_resamples, batch_size):
+        size = min(batch_size, n_resamples - start)
+        draws = rng.integers(0, n, size=(size, n)) + n * np.arange(size)[:, None]
+        weights = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n).astype(float)
+        batch = metrics_from_counts(*(weights @ one_hot).T)
+        batch['roc_auc'] = _roc_auc(*threshold_curve(y_true, y_proba, weights)[1:])
+        for name, values in batch.items():
+            samples.setdefault(name, []).append(values)
+
+    # Resamples drawing a single class have no ROC AUC and are left out of its interval
+    alpha = (1 - confidence) / 2
+    return {name: tuple(float(bound) for bound in np.nanquantile(np.concatenate(values), [alpha, 1 - alpha]))
+            for name, values in samples.items()}
+
+
+def log_metrics(metrics, logger, intervals: Optional[Dict[str, Tuple[float, float]]] = None):
+    """Logs the calculated metrics, with their confidence intervals if given."""
     logger.info("Model Evaluation:")
     for metric, value in metrics.items():
-        logger.info(f"{metric}: {value:.4f}")
+        if intervals is not None and metric in intervals:
+            low, high = intervals[metric]
+            logger.info(f"{metric}: {value:.4f} [{low:.4f}, {high:.4f}]")
+        else:
+            logger.info(f"{metric}: {value:.4f}")
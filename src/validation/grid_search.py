@@ -1,8 +1,116 @@
-from sklearn.model_selection import GridSearchCV, StratifiedKFold
+import tempfile
+from contextlib import contextmanager, nullcontext
 
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (GridSearchCV, HalvingGridSearchCV, HalvingRandomSearchCV, RandomizedSearchCV,
+                                     StratifiedKFold)
+from sklearn.utils import _safe_indexing
 
-def build_grid_search_cv(pipeline, param_grid, cv: int = 5, scoring: str = 'roc_auc', verbose: int = 3):
+from src.pipeline.options import SearchStrategy
+from utils.resources import ResourcePolicy
+
+
+def build_grid_search_cv(pipeline,
+                         param_grid,
+                         cv: int = 5,
+                         scoring: str = 'roc_auc',
+                         verbose: int = 3,
+                         search: SearchStrategy = SearchStrategy.GRID,
+                         budget: int = None,
+                         resource: str = None,
+                         policy: ResourcePolicy = None):
+    """
+    Builds the hyperparameter search for a pipeline.
+
+    Parameters:
+        pipeline: Pipeline to tune
+        param_grid (dict): Parameter grid
+        cv (int): Number of stratified folds
+        scoring (str): Metric to optimize
+        verbose (int): Verbosity of the search
+        search (SearchStrategy): 'grid' tries every combination. 'random' samples `budget` combinations.
+            'halving' runs successive halving, over the whole grid or, with a `budget`, over that many
+            sampled combinations.
+        budget (int): Number of parameter combinations sampled by the 'random' and 'halving' strategies
+        resource (str): Parameter grown by successive halving, e.g. the number of boosting rounds.
+            Its smallest and largest grid values bound the resource and it is removed from the grid.
+            Defaults to the number of training samples.
+        policy (ResourcePolicy): Cores of the search and threads of its estimator, by default all the cores
+            with single-threaded estimators unless configured through the environment
+
+    Returns:
+        The unfitted search.
+    """
+    policy = policy or ResourcePolicy()
+    policy.configure_estimator(pipeline)
     skf = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
+    common_params = dict(estimator=pipeline, cv=skf, scoring=scoring, verbose=verbose, n_jobs=policy.outer_jobs)
+
+    if search == SearchStrategy.GRID:
+        return GridSearchCV(param_grid=param_grid, **common_params)
+
+    if search == SearchStrategy.RANDOM:
+        return RandomizedSearchCV(param_distributions=param_grid, n_iter=budget or 10, random_state=42,
+                                  **common_params)
+
+    halving_params = dict(factor=3, random_state=42)
+    if resource is not None and resource in param_grid:
+        param_grid = dict(param_grid)
+        resource_values = param_grid.pop(resource)
+        halving_params.update(resource=resource,
+                              min_resources=min(resource_values),
+                              max_resources=max(resource_values))
+
+    if budget is None:
+        return HalvingGridSearchCV(param_grid=param_grid, **halving_params, **common_params)
+    return HalvingRandomSearchCV(param_distributions=param_grid, n_candidates=budget, **halving_params,
+                                 **common_params)
+
+
+@contextmanager
+def cached_pipeline_steps(search: GridSearchCV, cache_dir: str = None):
+    """
+    Caches the fitted steps before the final estimator for the duration of a search.
+
+    Only the estimator's hyperparameters change across the grid, so the pipeline is given a joblib
+    memory and every step before the estimator is fitted once per fold and then loaded from the
+    cache for the remaining parameter combinations. Cache keys hash each step's parameters
+    together with its input, which is why the custom transformers keep all their state in
+    parameters and fitted attributes. A sampler without a fixed random_state is resampled once
+    per fold, so every combination is trained on the same resampled fold.
+
+    The cache directory is removed on exit unless it is given as `cache_dir`, which lets searches over
+    pipelines with the same preprocessing share it. The memory is detached from the fitted search so
+    saved models do not reference it.
+    """
+    directory = tempfile.TemporaryDirectory(prefix='pipeline_cache_') if cache_dir is None else nullcontext(cache_dir)
+    with directory as cache_dir:
+        search.estimator.set_params(memory=cache_dir)
+        try:
+            yield search
+        finally:
+            search.estimator.set_params(memory=None)
+            if hasattr(search, 'best_estimator_'):
+                search.best_estimator_.set_params(memory=None)
+
+
+def _fit_steps(pipeline, X, y, cache_dir: str) -> None:
+    pipeline = clone(pipeline)
+    pipeline.steps[-1] = (pipeline.steps[-1][0], 'passthrough')
+    pipeline.set_params(memory=cache_dir).fit(X, y)
+
+
+def fit_cached_pipeline_steps(search: GridSearchCV, X, y, cache_dir: str, n_jobs: int = None) -> None:
+    """
+    Fits the steps before the final estimator into `cache_dir` on every training fold of the search and
+    on the whole data, the inputs of its refit.
 
-    return GridSearchCV(estimator=pipeline, param_grid=param_grid, cv=skf, scoring=scoring, verbose=verbose,
-                        n_jobs=-1)
+    Searches over the same steps and folds run in `cached_pipeline_steps(search, cache_dir)` then load
+    the fitted steps instead of fitting them again. The steps are fitted by the search's own pipeline,
+    so pipelines fitting them on part of the data only get the same cache entries.
+    """
+    subsets = [(_safe_indexing(X, train), _safe_indexing(y, train)) for train, _ in search.cv.split(X, y)]
+    Parallel(n_jobs=n_jobs)(delayed(_fit_steps)(search.estimator, X_subset, y_subset, cache_dir)
+                            for X_subset, y_subset in subsets + [(X, y)])
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from imblearn.over_sampling import SMOTE
+from sklearn.neighbors import NearestNeighbors
+
+from src.pipeline.imbalance import ApproximateNearestNeighbors
+
+
+def _imbalanced(n_minority: int, n_majority: int = 200):
+    rng = np.random.default_rng(0)
+    X = rng.random((n_majority + n_minority, 5))
+    y = np.r_[np.zeros(n_majority, dtype=int), np.ones(n_minority, dtype=int)]
+    return X, y
+
+
+def test_fewer_samples_than_neighbors_raises_like_nearest_neighbors():
+    X = np.random.default_rng(0).random((4, 3))
+    with pytest.raises(ValueError) as exact:
+        NearestNeighbors(n_neighbors=6).fit(X).kneighbors(X)
+    with pytest.raises(ValueError) as approximate:
+        ApproximateNearestNeighbors(n_neighbors=6).fit(X).kneighbors(X)
+    assert str(approximate.value) == str(exact.value)
+
+
+def test_smote_on_small_minority_class_raises():
+    X, y = _imbalanced(n_minority=4)
+    with pytest.raises(ValueError, match="Expected n_neighbors <= n_samples_fit"):
+        SMOTE(k_neighbors=ApproximateNearestNeighbors()).fit_resample(X, y)
+
+
+def test_smote_balances_classes():
+    X, y = _imbalanced(n_minority=20)
+    _, y_resampled = SMOTE(k_neighbors=ApproximateNearestNeighbors(leaf_size=16)).fit_resample(X, y)
+    assert np.bincount(y_resampled).tolist() == [200, 200]
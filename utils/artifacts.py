@@ -0,0 +1,155 @@
+import copy
+import os
+import pickle
+from enum import Enum
+from typing import Any, Dict, Optional
+
+import joblib
+
+from utils.logger import get_logger
+
+logger = get_logger("Artifacts")
+
+
+class ArtifactFormat(Enum):
+    # zlib-compressed pickle, smallest on disk but decompressed and copied by every process loading it
+    COMPRESSED = 'compressed'
+    # Uncompressed pickle, its NumPy arrays are memory-mapped read-only and shared by the processes loading it
+    MMAP = 'mmap'
+    # Uncompressed pipeline skeleton plus the booster saved in its library's own binary format
+    NATIVE = 'native'
+
+
+# File extension of the native model format of each booster library
+NATIVE_EXTENSIONS = {'xgboost': 'ubj', 'lightgbm': 'txt', 'catboost': 'cbm'}
+
+
+class NativeBoosterArtifact:
+    """Pipeline skeleton whose final estimator has no booster, the booster is stored next to it in `booster_file`"""
+
+    def __init__(self, skeleton, library: str, booster_file: str):
+        self.skeleton = skeleton
+        self.library = library
+        self.booster_file = booster_file
+
+
+def _final_estimator(model):
+    pipeline = getattr(model, 'best_estimator_', model)
+    return pipeline.steps[-1][1] if hasattr(pipeline, 'steps') else pipeline
+
+
+def _skeleton(model, estimator):
+    """
+    Shallow copy of a model, a search or a pipeline, with its final estimator replaced.
+
+    Samplers only act while fitting, they are replaced by unfitted clones: a fitted SMOTE keeps a nearest
+    neighbours index of the whole training set.
+    """
+    if hasattr(model, 'best_estimator_'):
+        model = copy.copy(model)
+        model.best_estimator_ = _skeleton(model.best_estimator_, estimator)
+        return model
+    if hasattr(model, 'steps'):
+        # scikit-learn is loaded by the model itself, not by importing this module
+        from sklearn.base import clone
+
+        model = copy.copy(model)
+        model.steps = [(name, clone(step) if hasattr(step, 'fit_resample') else step)
+                       for name, step in model.steps[:-1]] + [(model.steps[-1][0], estimator)]
+        return model
+    return estimator
+
+
+def _library(estimator) -> str:
+    return type(estimator).__module__.split('.')[0]
+
+
+def _save_booster(estimator, library: str, booster_path: str):
+    """Saves the booster in its native format and returns the estimator without it"""
+    if library == 'xgboost':
+        estimator.get_booster().save_model(booster_path)
+        skeleton = copy.copy(estimator)
+        del skeleton._Booster
+    elif library == 'lightgbm':
+        estimator.booster_.save_model(booster_path)
+        skeleton = copy.copy(estimator)
+        skeleton._Booster = None
+    else:
+        estimator.save_model(booster_path, format='cbm')
+        # An unfitted copy keeps the parameters, the trained model is loaded back into it
+        skeleton = type(estimator)(**estimator.get_params())
+    return skeleton
+
+
+def _load_booster(skeleton, library: str, booster_path: str) -> None:
+    """Loads the booster saved in its native format back into the estimator"""
+    if library == 'xgboost':
+        from xgboost import Booster
+        skeleton._Booster = Booster(model_file=booster_path)
+    elif library == 'lightgbm':
+        from lightgbm import Booster
+        skeleton._Booster = Booster(model_file=booster_path)
+    else:
+        skeleton.load_model(booster_path, format='cbm')
+
+
+def _is_compressed(path: str) -> bool:
+    # Uncompressed joblib files are plain pickles, compressed ones start with the compressor's magic number
+    with open(path, 'rb') as f:
+        return f.read(1) != pickle.PROTO
+
+
+def save_artifact(model, path: str, artifact_format: ArtifactFormat = ArtifactFormat.COMPRESSED,
+                  compress: int = 1) -> Dict[str, Any]:
+    """
+    Saves a model in the given format and returns what was written.
+
+    Args:
+        model: Fitted model, search or pipeline
+        path (str): Path of the .joblib file
+        artifact_format (ArtifactFormat): Format of the artifact
+        compress (int): joblib compression level of the compressed format
+
+    Returns:
+        Dict[str, Any]: The artifact's format and, for the native format, the booster file.
+    """
+    artifact = {'format': artifact_format.value}
+    if artifact_format == ArtifactFormat.NATIVE:
+        estimator = _final_estimator(model)
+        library = _library(estimator)
+        if library in NATIVE_EXTENSIONS:
+            stem = os.path.splitext(path)[0]
+            booster_file = f'{os.path.basename(stem)}.{NATIVE_EXTENSIONS[library]}'
+            # The extension is kept last, XGBoost picks the format from it
+            temporary_path = f'{stem}.tmp.{NATIVE_EXTENSIONS[library]}'
+            skeleton = _save_booster(estimator, library, temporary_path)
+            os.replace(temporary_path, os.path.join(os.path.dirname(path), booster_file))
+            model = NativeBoosterArtifact(_skeleton(model, skeleton), library, booster_file)
+            artifact['booster'] = booster_file
+        else:
+            logger.warning(f"{type(estimator).__name__} has no native format, saving it memory-mappable instead")
+            artifact['format'] = ArtifactFormat.MMAP.value
+
+    # Files are replaced rather than overwritten, processes still mapping the previous file keep a valid mapping
+    joblib.dump(model, f'{path}.tmp', compress=compress if artifact_format == ArtifactFormat.COMPRESSED else 0)
+    os.replace(f'{path}.tmp', path)
+    return artifact
+
+
+def load_artifact(path: str, mmap_mode: Optional[str] = 'r'):
+    """
+    Loads a model saved in any of the artifact formats.
+
+    Args:
+        path (str): Path of the .joblib file
+        mmap_mode (Optional[str]): Memory-mapping mode of the arrays in uncompressed files, None reads them into memory
+
+    Returns:
+        The model.
+    """
+    model = joblib.load(path, mmap_mode=None if _is_compressed(path) else mmap_mode)
+    if isinstance(model, NativeBoosterArtifact):
+        booster_path = os.path.join(os.path.dirname(path), model.booster_file)
+        _load_booster(_final_estimator(model.skeleton), model.library, booster_path)
+        model = model.skeleton
+    return model
@@ -1,17 +1,148 @@
+import hashlib
+import json
 import os
+from typing import Any, Dict, Iterator, List, Optional
 
+import numpy as np
 import pandas as pd
 
 data_dir_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+cache_dir_path = os.path.join(data_dir_path, 'cache')
 
-def load_data(file_name: str = 'train.csv') -> pd.DataFrame:
-    """Loads data into a pandas dataframe"""
+MANIFEST_FILE = 'manifest.json'
+
+
+def _file_hash(file_path: str) -> str:
+    """Computes the SHA-256 of a file without reading it into memory at once"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _read_manifest(cache_path: str) -> Optional[Dict[str, Any]]:
+    manifest_path = os.path.join(cache_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(cache_path: str, manifest: Dict[str, Any]) -> None:
+    # Write to a temporary file first so readers never see a partially written manifest
+    manifest_path = os.path.join(cache_path, MANIFEST_FILE)
+    with open(f'{manifest_path}.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(f'{manifest_path}.tmp', manifest_path)
+
+
+def _write_cache(df: pd.DataFrame, cache_path: str, manifest: Dict[str, Any]) -> None:
+    """Stores each column as a .npy file, string columns as integer codes plus their categories"""
+    os.makedirs(cache_path, exist_ok=True)
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object:
+            values = values.astype('category')
+            np.save(os.path.join(cache_path, f'{i}.npy'), values.cat.codes.to_numpy())
+            columns.append({'name': column, 'kind': 'string', 'categories': values.cat.categories.tolist()})
+        else:
+            np.save(os.path.join(cache_path, f'{i}.npy'), values.to_numpy())
+            columns.append({'name': column, 'kind': 'numeric'})
+    # The manifest is written last, an interrupted build is therefore never picked up
+    _write_manifest(cache_path, {**manifest, 'columns': columns})
+
+
+def _read_cache(cache_path: str,
+                manifest: Dict[str, Any],
+                dtype: Optional[Dict[str, Any]] = None,
+                columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Memory-maps the cached columns, only touching the files of the requested columns"""
+    dtype = dtype or {}
+    data = {}
+    for i, meta in enumerate(manifest['columns']):
+        name = meta['name']
+        if columns is not None and name not in columns:
+            continue
+        # Copy-on-write mapping: pages are shared until a column is modified in place
+        values = np.load(os.path.join(cache_path, f'{i}.npy'), mmap_mode='c').view(np.ndarray)
+        if meta['kind'] == 'numeric':
+            data[name] = values
+            continue
+        categorical = pd.Categorical.from_codes(values, categories=meta['categories'])
+        # String columns are only expanded to Python objects when no categorical dtype is requested
+        data[name] = categorical if dtype.get(name) == 'category' else np.asarray(categorical, dtype=object)
+    if columns is not None:
+        data = {column: data[column] for column in columns}
+    df = pd.DataFrame(data, copy=False)
+    remaining_dtypes = {column: column_dtype for column, column_dtype in dtype.items()
+                        if column in df.columns and column_dtype != 'category'}
+    return df.astype(remaining_dtypes) if remaining_dtypes else df
+
+
+def read_csv_cached(file_path: str,
+                    cache_path: str,
+                    dtype: Optional[Dict[str, Any]] = None,
+                    columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reads a CSV file through a columnar cache.
+
+    The first read parses the CSV and writes one memory-mappable .npy file per column to `cache_path`.
+    Later reads map those files instead of parsing. The cache is keyed by the file's modification time and
+    size, and falls back to its SHA-256 when they change, so touching the file does not force a rebuild.
+
+    Args:
+        file_path (str): Path of the CSV file.
+        cache_path (str): Directory holding the cached columns.
+        dtype (Optional[Dict[str, Any]]): Explicit column dtypes.
+        columns (Optional[List[str]]): Columns to load, all by default.
+
+    Returns:
+        pd.DataFrame: Loaded data.
+    """
+    stat = os.stat(file_path)
+    manifest = _read_manifest(cache_path)
+
+    if manifest is not None and (manifest['mtime_ns'], manifest['size']) != (stat.st_mtime_ns, stat.st_size):
+        if manifest['size'] == stat.st_size and manifest['sha256'] == _file_hash(file_path):
+            manifest['mtime_ns'] = stat.st_mtime_ns
+            _write_manifest(cache_path, manifest)
+        else:
+            manifest = None
+
+    if manifest is None:
+        df = pd.read_csv(file_path, dtype=dtype)
+        _write_cache(df, cache_path, {'sha256': _file_hash(file_path),
+                                      'mtime_ns': stat.st_mtime_ns,
+                                      'size': stat.st_size})
+        return df if columns is None else df[columns]
+
+    return _read_cache(cache_path, manifest, dtype, columns)
+
+
+def load_data(file_name: str = 'train.csv',
+              dtype: Optional[Dict[str, Any]] = None,
+              columns: Optional[List[str]] = None,
+              cache: bool = False) -> pd.DataFrame:
+    """Loads data into a pandas dataframe, optionally with explicit column dtypes and through the columnar cache"""
+    file_path = os.path.join(data_dir_path, f'raw/{file_name}')
+    if cache:
+        return read_csv_cached(file_path, os.path.join(cache_dir_path, file_name), dtype=dtype, columns=columns)
+    df = pd.read_csv(file_path, dtype=dtype, usecols=columns)
+    # usecols does not preserve the requested order
+    return df if columns is None else df[columns]
+
+
+def iter_data(file_name: str, chunksize: int, dtype: Optional[Dict[str, Any]] = None) -> Iterator[pd.DataFrame]:
+    """Lazily loads data in chunks of `chunksize` rows"""
     file_path = os.path.join(data_dir_path, f'raw/{file_name}')
-    return pd.read_csv(file_path)
+    with pd.read_csv(file_path, dtype=dtype, chunksize=chunksize) as reader:
+        yield from reader
 
 
-def save_data(df: pd.DataFrame, save_path: str) -> None:
-    """Saves pandas dataframe to disk as csv"""
+def save_data(df: pd.DataFrame, save_path: str, append: bool = False) -> None:
+    """Saves pandas dataframe to disk as csv, appending to an existing file without a header if requested"""
     save_path = os.path.join(data_dir_path, save_path)
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    df.to_csv(save_path, index=False)
+    df.to_csv(save_path, index=False, mode='a' if append else 'w', header=not append)
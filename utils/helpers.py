@@ -1,12 +1,25 @@
 import os
 import re
-import joblib
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
 import pandas as pd
 
+from utils.artifacts import ArtifactFormat, load_artifact, save_artifact
+from utils.data import _file_hash, _read_manifest, _write_manifest
 from utils.logger import get_logger
 
 logger = get_logger("Utilities")
 
+models_dir_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
+
+# Matches both xgb_v1.joblib and xgb_v3.0.joblib
+MODEL_FILE_PATTERN = re.compile(r"(?P<name>.+)_v(?P<version>\d+(?:\.\d+)?)\.joblib")
+
+# Number of loaded models kept in memory by `load_model`
+MODEL_CACHE_SIZE = 8
+
 
 def check_and_print_missing_value_counts(data: pd.DataFrame, column_name: str) -> None:
     """Counts and displays missing value counts for given column_name"""
@@ -26,45 +39,134 @@ def validate_dataframe(X, expected_columns):
             raise ValueError(f"Missing expected column: {col}")
 
 
-def load_model(model_name):
-    logger.info(f"Loading model {model_name}")
-    models_dir_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
-    model_path = os.path.join(models_dir_path, model_name)
-    return joblib.load(model_path)
+def _model_path(model_file: str) -> str:
+    return os.path.join(models_dir_path, model_file)
 
 
-def save_model(pipeline, model_name, compress=1):
-    logger.info(f"Saving model {model_name}")
-    model_path = os.path.join(os.path.abspath('models'), model_name)
-    os.makedirs(os.path.dirname(model_path), exist_ok=True)
-    joblib.dump(pipeline, model_path, compress=compress)
+def _parse_model_file(model_file: str) -> Optional[Tuple[str, str]]:
+    """Splits a model file name into the model name and its version, e.g. ('xgb', '3.0') for xgb_v3.0.joblib"""
+    match = MODEL_FILE_PATTERN.fullmatch(model_file)
+    return None if match is None else (match.group('name'), str(float(match.group('version'))))
 
 
-def load_latest_model(model_name):
-    # Sort by version number in descending order
-    latest_model_file = get_latest_model_file(model_name)
+def _file_entry(model_file: str) -> Dict[str, Any]:
+    stat = os.stat(_model_path(model_file))
+    return {'file': model_file, 'size': stat.st_size, 'sha256': _file_hash(_model_path(model_file))}
 
-    # Load the latest model
-    logger.info(f"Loading latest model: {latest_model_file}")
-    return load_model(latest_model_file), latest_model_file
 
+def _register(manifest: Dict[str, Any], model_file: str, **metadata) -> None:
+    name, version = _parse_model_file(model_file)
+    model = manifest['models'].setdefault(name, {'latest': version, 'versions': {}})
+    model['versions'][version] = {**_file_entry(model_file), 'version': float(version), **metadata}
+    model['latest'] = max(model['versions'], key=float)
 
-def get_latest_model_file(model_name):
-    models_dir_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'models'))
-    # Compile a regex pattern to match model files with versioning
-    pattern = re.compile(rf"{model_name}_v(\d+)\.joblib")
 
-    # List all files in the directory
-    files = os.listdir(models_dir_path)
+def _load_manifest() -> Dict[str, Any]:
+    """Reads the model manifest, indexing the model files already in the directory when there is none yet"""
+    manifest = _read_manifest(models_dir_path)
+    if manifest is not None:
+        return manifest
+    manifest = {'models': {}}
+    if os.path.isdir(models_dir_path):
+        for model_file in sorted(os.listdir(models_dir_path)):
+            if _parse_model_file(model_file) is not None:
+                _register(manifest, model_file)
+        _write_manifest(models_dir_path, manifest)
+    return manifest
+
+
+@lru_cache(maxsize=MODEL_CACHE_SIZE)
+def _load_model_file(model_path: str, mtime_ns: int, size: int):
+    # The modification time and size are part of the cache key so an overwritten file is loaded again
+    return load_artifact(model_path)
+
 
-    # Find all matching files with their version numbers
-    model_files = [(file, int(pattern.search(file).group(1)))
-                   for file in files if pattern.search(file)]
+def load_model(model_name, cache=True):
+    """
+    Loads a saved model, by default through an in-process LRU cache so repeated loads of the same
+    file return the same object. Cached models are shared and must not be modified.
 
-    if not model_files:
+    Arrays of uncompressed models are memory-mapped read-only, processes loading the same model share them.
+    """
+    logger.info(f"Loading model {model_name}")
+    model_path = _model_path(model_name)
+    if not cache:
+        return load_artifact(model_path)
+    stat = os.stat(model_path)
+    return _load_model_file(model_path, stat.st_mtime_ns, stat.st_size)
+
+
+def save_model(pipeline, model_name, compress=1, metrics=None, features=None,
+               artifact_format: ArtifactFormat = ArtifactFormat.COMPRESSED, threshold=None):
+    """
+    Saves a model and records it in the model manifest.
+
+    Args:
+        pipeline: Fitted model
+        model_name (str): File name of the model, e.g. xgb_v3.0.joblib
+        compress (int): joblib compression level
+        metrics (Optional[Dict[str, float]]): Evaluation metrics of the model
+        features (Optional[Dict[str, str]]): Input columns of the model and their dtypes
+        artifact_format (ArtifactFormat): Compressed, memory-mappable, or with the booster in its native format
+        threshold (Optional[float]): Decision threshold of the positive class stored with the model, if tuned
+    """
+    logger.info(f"Saving model {model_name} as a {artifact_format.value} artifact")
+    os.makedirs(models_dir_path, exist_ok=True)
+    artifact = save_artifact(pipeline, _model_path(model_name), artifact_format, compress)
+
+    if _parse_model_file(model_name) is None:
+        logger.warning(f"{model_name} is not named <model>_v<version>.joblib and is not added to the manifest")
+        return
+    manifest = _load_manifest()
+    _register(manifest, model_name,
+              artifact=artifact,
+              metrics={metric: float(value) for metric, value in (metrics or {}).items()},
+              features=features,
+              threshold=threshold,
+              saved_at=datetime.now().isoformat(timespec='seconds'))
+    _write_manifest(models_dir_path, manifest)
+
+
+def convert_model(model_file: str, artifact_format: ArtifactFormat) -> None:
+    """Rewrites a saved model in another artifact format, keeping its metrics, features and threshold in the manifest"""
+    name, version = _parse_model_file(model_file)
+    info = get_model_info(name, float(version)) or {}
+    save_model(load_model(model_file, cache=False), model_file, metrics=info.get('metrics'),
+               features=info.get('features'), artifact_format=artifact_format, threshold=info.get('threshold'))
+
+    # A booster file the new artifact does not use any more
+    previous_booster = info.get('artifact', {}).get('booster')
+    if previous_booster not in (None, get_model_info(name, float(version))['artifact'].get('booster')):
+        os.remove(_model_path(previous_booster))
+
+
+def get_model_info(model_name: str, version: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Manifest entry of a model version, the latest version by default, or None if it is not registered"""
+    model = _load_manifest()['models'].get(model_name)
+    if model is None:
+        return None
+    return model['versions'].get(model['latest'] if version is None else str(float(version)))
+
+
+def get_latest_model_file(model_name):
+    info = get_model_info(model_name)
+    if info is None:
         logger.error(f"No model files found for {model_name} in {models_dir_path}.")
         return None
+    return info['file']
+
+
+def get_model_file(model_name: str, version: Optional[float] = None) -> Optional[str]:
+    """File of a model version, the latest version when no version is given"""
+    if version is None:
+        return get_latest_model_file(model_name)
+    info = get_model_info(model_name, version)
+    return f'{model_name}_v{version}.joblib' if info is None else info['file']
 
-    # Sort by version number in descending order
-    latest_model_file = sorted(model_files, key=lambda x: x[1], reverse=True)[0][0]
-    return latest_model_file
+
+def load_latest_model(model_name):
+    latest_model_file = get_latest_model_file(model_name)
+
+    # Load the latest model
+    logger.info(f"Loading latest model: {latest_model_file}")
+    return load_model(latest_model_file), latest_model_file
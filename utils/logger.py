@@ -1,65 +1,188 @@
-import os
+import atexit
+import copy
+import json
 import logging
-import colorlog
+import multiprocessing.util
+import os
+import queue
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Union
+
+import colorlog
+
+# Level of the messages logged on every batch a pipeline transforms. It is below INFO, so by default these
+# messages are dropped by the logger's level check before a record is even created
+HOT_PATH = 15
+logging.addLevelName(HOT_PATH, 'HOT_PATH')
+
+# Environment variables shared with worker processes, so they log into the parent's file at the parent's level
+LOG_DIR_ENV = 'MIND_MATTERS_LOG_DIR'
+LOG_FILE_ENV = 'MIND_MATTERS_LOG_FILE'
+LOG_LEVEL_ENV = 'MIND_MATTERS_LOG_LEVEL'
+
+LOG_COLORS = {
+    "DEBUG": "cyan",
+    "HOT_PATH": "blue",
+    "INFO": "green",
+    "WARNING": "yellow",
+    "ERROR": "red",
+    "CRITICAL": "bold_red",
+}
+
+_lock = threading.Lock()
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+_loggers = set()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats every record as a JSON object on a single line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """Queue handler sending the records to the listener thread with their traceback already formatted"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # The listener and the log file are only created by the first record, importing a module creates neither
+        if _listener is None:
+            with _lock:
+                if _listener is None:
+                    _start_listener()
+        super().emit(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merges the arguments into the message like QueueHandler, but keeps the traceback apart from it
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _level(level: Union[int, str, None]) -> int:
+    level = level or os.environ.get(LOG_LEVEL_ENV) or logging.INFO
+    if isinstance(level, str):
+        level = int(level) if level.isdigit() else logging.getLevelName(level.upper())
+    return level
+
+
+def _log_file() -> str:
+    """Log file of the process group: the parent names it and its workers inherit it through the environment"""
+    if LOG_FILE_ENV not in os.environ:
+        log_dir = os.environ.get(LOG_DIR_ENV, 'logs')
+        name = f"mind_matters_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl"
+        os.environ[LOG_FILE_ENV] = os.path.abspath(os.path.join(log_dir, name))
+    return os.environ[LOG_FILE_ENV]
+
+
+def _start_listener() -> None:
+    """Starts the thread writing the queued records to the console and the log file"""
+    global _listener, _listener_pid
+    log_file = _log_file()
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(colorlog.ColoredFormatter('[%(levelname)s] %(asctime)s: %(name)s - %(message)s',
+                                                           log_colors=LOG_COLORS, datefmt='%Y-%m-%d %H:%M:%S'))
+
+    _listener = QueueListener(_queue_handler.queue, file_handler, console_handler)
+    _listener.start()
+    _listener_pid = os.getpid()
+    # Forked multiprocessing workers exit through os._exit after running its finalizers, not atexit
+    multiprocessing.util.Finalize(None, _stop_listener, exitpriority=0)
+
+
+def _stop_listener() -> None:
+    """Writes the records left in the queue, stops the listener of this process and closes its handlers"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        # Closing the handlers flushes and closes the log file
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
 
+def _restart_after_fork() -> None:
+    # The listener thread does not survive a fork, the child gets a queue of its own and starts a listener on
+    # its first record
+    global _lock, _listener
+    _lock = threading.Lock()
+    _listener = None
+    if _queue_handler is not None:
+        _queue_handler.queue = queue.SimpleQueue()
 
-def get_logger(name="main", log_dir="logs", log_level=logging.INFO):
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(_stop_listener)
+
+
+def configure_logging(log_level: Union[int, str, None] = None, log_dir: Optional[str] = None) -> None:
     """
-    Creates and returns a logger with colored console logs and file logging.
+    Sets the level of every logger and the directory of the log file, for this process and its workers.
 
     Args:
-        name (str): The name of the logger.
-        log_dir (str): The directory where log files will be stored.
-        log_level (int): The logging level (e.g., logging.DEBUG, logging.INFO).
-
-    Returns:
-        logging.Logger: Configured logger instance.
+        log_level (Union[int, str, None]): Level or level name, e.g. 'hot_path' to also log every transformed
+            batch. From MIND_MATTERS_LOG_LEVEL or INFO by default.
+        log_dir (Optional[str]): Directory of the log file, from MIND_MATTERS_LOG_DIR or logs by default.
+            Only applies before the first record is logged.
     """
+    level = _level(log_level)
+    os.environ[LOG_LEVEL_ENV] = str(level)
+    if log_dir is not None:
+        os.environ[LOG_DIR_ENV] = log_dir
+    for name in _loggers:
+        logging.getLogger(name).setLevel(level)
 
-    # Ensure the log directory exists
-    os.makedirs(log_dir, exist_ok=True)
 
-    # Create a log file name with a timestamp
-    log_file = os.path.join(log_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+def get_logger(name="main", log_dir=None, log_level=None):
+    """
+    Returns a logger writing through the process's logging queue.
 
-    # Create a logger
-    logger = logging.getLogger(name)
-    logger.setLevel(log_level)
+    Records are put on a queue and formatted and written by a background thread, as colored text on the
+    console and as JSON lines into one log file shared by the process and its workers. The thread and the
+    file are created by the first record. Calling it again with the same name returns the same logger
+    without adding handlers.
 
-    # Create a file handler for logging to a file
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setLevel(log_level)
+    Args:
+        name (str): The name of the logger.
+        log_dir (Optional[str]): The directory where the log file is stored, see `configure_logging`.
+        log_level (Union[int, str, None]): The logging level of this logger, by default the configured one.
 
-    # Create a console handler for colored logging
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(log_level)
-
-    # Define log colors for different levels
-    log_colors = {
-        "DEBUG": "cyan",
-        "INFO": "green",
-        "WARNING": "yellow",
-        "ERROR": "red",
-        "CRITICAL": "bold_red",
-    }
-
-    # Set formatter for file handler (no colors)
-    file_formatter = logging.Formatter('[%(levelname)s] %(asctime)s: %(name)s - %(message)s')
-    file_handler.setFormatter(file_formatter)
-
-    # Set formatter for console handler (with colors)
-    console_formatter = colorlog.ColoredFormatter(
-        '[%(levelname)s] %(asctime)s: %(name)s - %(message)s',
-        log_colors=log_colors,
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_handler.setFormatter(console_formatter)
-
-    # Add the handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    Returns:
+        logging.Logger: Configured logger instance.
+    """
+    global _queue_handler
+    logger = logging.getLogger(name)
+    if log_dir is not None and _listener is None:
+        os.environ.setdefault(LOG_DIR_ENV, log_dir)
+    with _lock:
+        if _queue_handler is None:
+            _queue_handler = _QueueHandler(queue.SimpleQueue())
+        if _queue_handler not in logger.handlers:
+            logger.addHandler(_queue_handler)
+        _loggers.add(name)
 
+    logger.setLevel(_level(log_level))
     # Prevent duplicate logging
     logger.propagate = False
 
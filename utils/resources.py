@@ -0,0 +1,113 @@
+import inspect
+import os
+from contextlib import contextmanager
+from typing import List, Optional
+
+from joblib import parallel_config
+from threadpoolctl import threadpool_limits
+
+from utils.logger import get_logger
+
+logger = get_logger("Resources")
+
+# Environment variables overriding the default core budget
+N_CORES_ENV = 'MIND_MATTERS_N_CORES'
+INNER_THREADS_ENV = 'MIND_MATTERS_INNER_THREADS'
+
+# Estimator parameters setting the number of threads a model trains with, the first one an estimator accepts is used:
+# n_jobs for XGBoost, LightGBM and scikit-learn, thread_count for CatBoost, nthread and num_threads are their aliases
+THREAD_PARAMS = ('n_jobs', 'thread_count', 'nthread', 'num_threads')
+
+# Library default of every thread parameter, all the cores, None for all but CatBoost which does not accept it
+DEFAULT_THREADS = {'thread_count': -1}
+
+
+def available_cores() -> int:
+    """Number of cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _thread_param(estimator) -> Optional[str]:
+    # CatBoost only lists the parameters it was given in get_params, its constructor lists them all
+    params = set(estimator.get_params()) | set(inspect.signature(type(estimator).__init__).parameters)
+    return next((param for param in THREAD_PARAMS if param in params), None)
+
+
+def _final_estimator(pipeline):
+    return pipeline.steps[-1][1] if hasattr(pipeline, 'steps') else pipeline
+
+
+class ResourcePolicy:
+    """
+    Splits a budget of cores between the outer parallelism of a search, the number of candidates and folds
+    fitted at the same time, and the threads each fit uses: the estimator's own threads and BLAS/OpenMP.
+
+    `outer_jobs * inner_threads` never exceeds `n_cores`, so a search with n_jobs=-1 around estimators that
+    start one thread per core no longer runs n_cores² threads.
+    """
+
+    def __init__(self, n_cores: Optional[int] = None, inner_threads: Optional[int] = None):
+        """
+        Parameters:
+            n_cores (Optional[int]): Number of cores, from MIND_MATTERS_N_CORES or all available ones by default
+            inner_threads (Optional[int]): Threads of each fit, from MIND_MATTERS_INNER_THREADS or 1 by default.
+                Capped at `n_cores`.
+        """
+        self.n_cores = max(1, n_cores or int(os.environ.get(N_CORES_ENV, 0)) or available_cores())
+        inner_threads = inner_threads or int(os.environ.get(INNER_THREADS_ENV, 0)) or 1
+        self.inner_threads = min(max(1, inner_threads), self.n_cores)
+        self.outer_jobs = self.n_cores // self.inner_threads
+
+    def __repr__(self):
+        return f'ResourcePolicy(n_cores={self.n_cores}, inner_threads={self.inner_threads})'
+
+    def split(self, n_parts: int) -> List['ResourcePolicy']:
+        """Divides the cores between `n_parts` jobs run at the same time, at most one job per core"""
+        n_parts = max(1, min(n_parts, self.n_cores))
+        return [ResourcePolicy(self.n_cores // n_parts + (i < self.n_cores % n_parts), self.inner_threads)
+                for i in range(n_parts)]
+
+    def configure_estimator(self, pipeline) -> None:
+        """Sets the number of threads of the final estimator of a pipeline"""
+        estimator = _final_estimator(pipeline)
+        param = _thread_param(estimator)
+        if param is not None:
+            estimator.set_params(**{param: self.inner_threads})
+
+    def configure(self, search) -> None:
+        """
+        Sets the number of parallel fits of a search and the number of threads of its estimator.
+
+        The thread cap is meant for the cross-validation fits only, `restore` lifts it once they are done so
+        the saved model does not keep it.
+        """
+        search.n_jobs = self.outer_jobs
+        self.configure_estimator(search.estimator)
+
+    @staticmethod
+    def restore(search) -> None:
+        """Gives the estimator of a search and its fitted best estimator back their library's number of threads"""
+        for pipeline in (search.estimator, getattr(search, 'best_estimator_', None)):
+            if pipeline is None:
+                continue
+            estimator = _final_estimator(pipeline)
+            param = _thread_param(estimator)
+            if param is None:
+                continue
+            if type(estimator).__module__.startswith('catboost') and estimator.is_fitted():
+                # A fitted CatBoost model refuses new parameters, its default is the absence of thread_count
+                estimator._init_params.pop(param, None)
+                continue
+            estimator.set_params(**{param: DEFAULT_THREADS.get(param)})
+            # XGBoost predicts with the threads its booster was trained with, 0 is all of them
+            if hasattr(estimator, 'get_booster') and getattr(estimator, '_Booster', None) is not None:
+                estimator.get_booster().set_param({'nthread': 0})
+
+    @contextmanager
+    def limits(self):
+        """Caps the BLAS/OpenMP threads of this process and of the joblib workers started in the context"""
+        with threadpool_limits(limits=self.inner_threads), \
+                parallel_config(backend='loky', inner_max_num_threads=self.inner_threads):
+            yield self